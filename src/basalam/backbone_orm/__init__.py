@@ -1,15 +1,26 @@
 from .api_resource_abstract import ApiResourceAbstract
+from .cache_codec import CacheCodec, PickleCacheCodec, StaleCacheEntryException
+from .cache_flight import CacheFlight
+from .compiled_query_cache import CompiledQueryCache
+from .data_loader import DataLoader
 from .factory_abstract import FactoryAbstract, U
+from .hydrator import Hydrator
+from .identity_map import IdentityMap
+from .layered_cache import LayeredCache, LocalCache
 from .migration_abstract import MigrationAbstract
 from .model_abstract import ModelAbstract, T
 from .model_schema_abstract import ModelSchemaAbstract
-from .pagination import PaginationResponse
+from .pagination import PaginationResponse, CursorPaginationResponse, InvalidCursorException
 from .parameters import Parameters
 from .postgres_connection import PostgresConnection
 from .postgres_transaction import PostgresTransaction
+from .prepared_statement_cache import PreparedStatementCache
 from .query_builder_abstract import QueryBuilderAbstract, V
-from .relation import Relation
+from .relation import Relation, RelationNotJoinableException, RelationNotAggregatableException
 from .relation_applier import RelationApplier
+from .relation_tree import RelationTree
 from .repository_abstract import RepositoryAbstract
+from .repository_cache import RepositoryCache
 from .seeder_abstract import SeederAbstract
+from .unit_of_work import UnitOfWork
 from .postgres_manager import PostgresManager, DriverEnum, ConnectionConfig
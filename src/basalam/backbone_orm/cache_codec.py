@@ -0,0 +1,120 @@
+import importlib
+import pickle
+import zlib
+from typing import Any, Dict, Optional, Tuple, Type
+
+from .model_abstract import ModelAbstract
+
+
+class StaleCacheEntryException(Exception):
+    pass
+
+
+class CacheCodec:
+    # Bump when the payload layout changes, older entries are then read as misses.
+    VERSION = 1
+    MODEL = "\x00model"
+    PLAIN = 0
+    COMPRESSED = 1
+
+    __model_classes: Dict[str, Type[ModelAbstract]] = {}
+    __columns: Dict[Type[ModelAbstract], Tuple[Tuple[str, ...], int]] = {}
+
+    def __init__(self, compress_threshold: int = 1024) -> None:
+        self.__compress_threshold = compress_threshold
+
+    def serialize(self, value: Any) -> bytes:
+        payload = pickle.dumps(self.encode(value), protocol=4)
+        if len(payload) > self.__compress_threshold:
+            return bytes([self.VERSION, self.COMPRESSED]) + zlib.compress(payload)
+        return bytes([self.VERSION, self.PLAIN]) + payload
+
+    def deserialize(self, payload: bytes) -> Any:
+        if len(payload) < 2 or payload[0] != self.VERSION:
+            return None
+
+        body = payload[2:]
+        if payload[1] == self.COMPRESSED:
+            body = zlib.decompress(body)
+
+        try:
+            return self.decode(pickle.loads(body))
+        except StaleCacheEntryException:
+            return None
+
+    def encode(self, value: Any) -> Any:
+        if isinstance(value, ModelAbstract):
+            model_class = type(value)
+            columns, fingerprint = self.columns(model_class)
+            return (
+                self.MODEL,
+                self.register(model_class),
+                fingerprint,
+                tuple(
+                    value.x_original[column] if column in value.x_original else getattr(value, column)
+                    for column in columns
+                ),
+                {name: self.encode(relation) for name, relation in value.x_relations.items()},
+                tuple(value.x_applied_relations),
+            )
+        if isinstance(value, list):
+            return [self.encode(item) for item in value]
+        if isinstance(value, dict):
+            return {key: self.encode(item) for key, item in value.items()}
+        return value
+
+    def decode(self, value: Any) -> Any:
+        if isinstance(value, tuple) and len(value) == 6 and value[0] == self.MODEL:
+            _, key, fingerprint, values, relations, applied_relations = value
+            model_class = self.model_class(key)
+            columns, current_fingerprint = self.columns(model_class)
+            if current_fingerprint != fingerprint:
+                raise StaleCacheEntryException(key)
+
+            row = dict(zip(columns, values))
+            model = model_class(**row, x_original=dict(row))
+            model.x_relations = {name: self.decode(relation) for name, relation in relations.items()}
+            model.x_applied_relations = set(applied_relations)
+            return model
+        if isinstance(value, list):
+            return [self.decode(item) for item in value]
+        if isinstance(value, dict):
+            return {key: self.decode(item) for key, item in value.items()}
+        return value
+
+    @classmethod
+    def register(cls, model_class: Type[ModelAbstract]) -> str:
+        key = f"{model_class.__module__}:{model_class.__qualname__}"
+        cls.__model_classes[key] = model_class
+        return key
+
+    @classmethod
+    def model_class(cls, key: str) -> Type[ModelAbstract]:
+        model_class: Optional[Type] = cls.__model_classes.get(key)
+        if model_class is None:
+            module, _, name = key.partition(":")
+            try:
+                model_class = getattr(importlib.import_module(module), name)
+            except (ImportError, AttributeError):
+                raise StaleCacheEntryException(key)
+            if not isinstance(model_class, type) or not issubclass(model_class, ModelAbstract):
+                raise StaleCacheEntryException(key)
+            cls.__model_classes[key] = model_class
+        return model_class
+
+    @classmethod
+    def columns(cls, model_class: Type[ModelAbstract]) -> Tuple[Tuple[str, ...], int]:
+        if model_class not in cls.__columns:
+            columns = tuple(name for name in model_class.model_fields.keys() if name[0:2] != "x_")
+            fingerprint = zlib.crc32(",".join(columns).encode())
+            cls.__columns[model_class] = (columns, fingerprint)
+        return cls.__columns[model_class]
+
+
+class PickleCacheCodec(CacheCodec):
+
+    def serialize(self, value: Any) -> bytes:
+        return pickle.dumps(value)
+
+    def deserialize(self, payload: bytes) -> Any:
+        return pickle.loads(payload)
@@ -0,0 +1,136 @@
+import asyncio
+import hashlib
+import math
+import random
+import time
+import uuid
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from .repository_cache import RepositoryCache
+
+
+class CacheFlight:
+    # Entries written with early refresh enabled are wrapped so readers know when they expire
+    # and how long they took to compute.
+    VALUE = "x_value"
+    EXPIRES_AT = "x_expires_at"
+    DELTA = "x_delta"
+
+    __flights: Dict[Tuple, asyncio.Future] = {}
+
+    def __init__(
+            self,
+            cache: Callable[[], Awaitable[RepositoryCache]],
+            keys: List[str],
+            lock_seconds: float = 10,
+            early_refresh_beta: float = 0,
+    ) -> None:
+        self.__cache_factory = cache
+        self.__cache: Optional[RepositoryCache] = None
+        self.__keys = keys
+        self.__lock_seconds = lock_seconds
+        self.__early_refresh_beta = early_refresh_beta
+        self.__lead: Optional[Tuple[Tuple, str, str]] = None
+        self.__started_at = time.monotonic()
+
+    async def __aenter__(self) -> "CacheFlight":
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, exc_tb) -> bool:
+        await self.release()
+        return False
+
+    async def cache(self) -> RepositoryCache:
+        if self.__cache is None:
+            self.__cache = await self.__cache_factory()
+        return self.__cache
+
+    async def read(self) -> List[Any]:
+        if len(self.__keys) == 0:
+            return []
+
+        self.__started_at = time.monotonic()
+        values = await self.__mget(self.__keys)
+        missing = [key for key, value in zip(self.__keys, values) if value is None]
+        if len(missing) == 0:
+            return values
+
+        # Only one loader recomputes a set of missing entries, in this process through a shared
+        # future and across workers through a short Redis lock; the others wait and read again.
+        loop = asyncio.get_running_loop()
+        flight_key = (loop, tuple(sorted(missing)))
+        flight = CacheFlight.__flights.get(flight_key)
+        if flight is None:
+            # Registered before the first await, so loaders arriving meanwhile wait on it.
+            CacheFlight.__flights[flight_key] = loop.create_future()
+            lock_key = "lock::" + hashlib.sha1("\n".join(flight_key[1]).encode()).hexdigest()
+            token = uuid.uuid4().hex
+            try:
+                if await (await self.cache()).lock(lock_key, token, self.__lock_seconds):
+                    self.__lead = (flight_key, lock_key, token)
+                    return values
+                await self.__wait_for_lock(lock_key)
+            except BaseException:
+                self.__land(flight_key)
+                raise
+            self.__land(flight_key)
+        else:
+            try:
+                await asyncio.wait_for(asyncio.shield(flight), self.__lock_seconds)
+            except asyncio.TimeoutError:
+                pass
+
+        refreshed = dict(zip(missing, await self.__mget(missing)))
+        return [refreshed.get(key) if value is None else value for key, value in zip(self.__keys, values)]
+
+    async def write(self, values: Dict[str, Any], seconds: int) -> None:
+        if len(values) == 0:
+            return
+
+        if self.__early_refresh_beta > 0:
+            delta = time.monotonic() - self.__started_at
+            expires_at = time.time() + seconds
+            values = {
+                key: {self.VALUE: value, self.EXPIRES_AT: expires_at, self.DELTA: delta}
+                for key, value in values.items()
+            }
+
+        await (await self.cache()).mset(values, seconds)
+
+    async def release(self) -> None:
+        if self.__lead is None:
+            return
+
+        flight_key, lock_key, token = self.__lead
+        self.__lead = None
+        self.__land(flight_key)
+        await (await self.cache()).unlock(lock_key, token)
+
+    @classmethod
+    def __land(cls, flight_key: Tuple) -> None:
+        flight = cls.__flights.pop(flight_key, None)
+        if flight is not None and not flight.done():
+            flight.set_result(None)
+
+    async def __wait_for_lock(self, lock_key: str) -> None:
+        cache = await self.cache()
+        deadline = time.monotonic() + self.__lock_seconds
+        while time.monotonic() < deadline and await cache.locked(lock_key):
+            await asyncio.sleep(0.05)
+
+    async def __mget(self, keys: List[str]) -> List[Any]:
+        values = await (await self.cache()).mget(keys)
+        return [self.__unwrap(value) for value in values]
+
+    def __unwrap(self, value: Any) -> Any:
+        if not isinstance(value, dict) or self.EXPIRES_AT not in value:
+            return value
+
+        # Probabilistic early expiration: the closer to expiry and the slower the entry is to
+        # compute, the likelier a reader treats it as a miss and refreshes it ahead of time.
+        if self.__early_refresh_beta > 0:
+            jitter = value[self.DELTA] * self.__early_refresh_beta * -math.log(1 - random.random())
+            if time.time() + jitter >= value[self.EXPIRES_AT]:
+                return None
+
+        return value[self.VALUE]
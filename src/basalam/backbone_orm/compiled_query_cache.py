@@ -0,0 +1,41 @@
+from collections import OrderedDict
+from typing import Callable, Hashable, Union
+
+from pypika.queries import QueryBuilder
+
+
+class CompiledQueryCache:
+
+    def __init__(self, max_size: int = 1024) -> None:
+        self.__max_size = max_size
+        self.__queries: "OrderedDict[Hashable, str]" = OrderedDict()
+
+    def get_or_compile(
+            self, key: Hashable, compiler: Callable[[], Union[QueryBuilder, str]]
+    ) -> str:
+        query = self.__queries.get(key)
+        if query is not None:
+            self.__queries.move_to_end(key)
+            return query
+
+        query = compiler()
+        query = query if type(query) is str else query.get_sql()
+
+        if self.__max_size > 0:
+            self.__queries[key] = query
+            if len(self.__queries) > self.__max_size:
+                self.__queries.popitem(last=False)
+
+        return query
+
+    def forget(self, key: Hashable) -> None:
+        self.__queries.pop(key, None)
+
+    def clear(self) -> None:
+        self.__queries.clear()
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self.__queries
+
+    def __len__(self) -> int:
+        return len(self.__queries)
@@ -0,0 +1,71 @@
+import asyncio
+from contextvars import ContextVar
+from typing import Any, AsyncContextManager, Awaitable, Callable, Dict, List, Optional
+
+from .postgres_connection import PostgresConnection
+
+
+class SiblingConnection:
+
+    def __init__(self, connection: PostgresConnection) -> None:
+        self.__connection = connection
+        self.__context: Optional[AsyncContextManager[PostgresConnection]] = None
+        self.__sibling: Optional[PostgresConnection] = None
+        self.__lock = asyncio.Lock()
+
+    async def acquire(self) -> PostgresConnection:
+        async with self.__lock:
+            if self.__sibling is None:
+                self.__context = self.__connection.sibling()
+                self.__sibling = await self.__context.__aenter__()
+        return self.__sibling
+
+    async def release(self) -> None:
+        if self.__context is not None:
+            await self.__context.__aexit__(None, None, None)
+            self.__context = None
+            self.__sibling = None
+
+
+class ConcurrentExecutor:
+    __overrides: ContextVar[Dict[PostgresConnection, SiblingConnection]] = ContextVar(
+        "backbone_orm_connection_overrides", default={}
+    )
+
+    @classmethod
+    async def resolve(cls, connection: PostgresConnection) -> PostgresConnection:
+        sibling = cls.__overrides.get().get(connection)
+        return connection if sibling is None else await sibling.acquire()
+
+    @classmethod
+    async def gather(
+            cls,
+            connection: PostgresConnection,
+            factories: List[Callable[[], Awaitable[Any]]],
+            concurrency: int,
+    ) -> List[Any]:
+        # Each factory runs in its own task, queries made through `connection` there go to a
+        # sibling pooled connection that is only acquired if the task actually hits the database.
+        # Nested calls keep running on the sibling their parent task already holds, a task never
+        # waits for another pooled connection while keeping one.
+        if (
+                concurrency <= 1
+                or len(factories) <= 1
+                or not connection.can_spawn_siblings
+                or connection in cls.__overrides.get()
+        ):
+            return [await factory() for factory in factories]
+
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def run(factory: Callable[[], Awaitable[Any]]) -> Any:
+            async with semaphore:
+                sibling = SiblingConnection(connection)
+                token = cls.__overrides.set({**cls.__overrides.get(), connection: sibling})
+                try:
+                    return await factory()
+                finally:
+                    cls.__overrides.reset(token)
+                    await sibling.release()
+
+        return list(await asyncio.gather(*[run(factory) for factory in factories]))
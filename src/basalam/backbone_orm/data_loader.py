@@ -0,0 +1,84 @@
+import asyncio
+import contextvars
+from typing import Any, Awaitable, Callable, Dict, Hashable, List, Set, Tuple
+
+
+class DataLoader:
+    __batches: Dict[asyncio.AbstractEventLoop, Dict[Tuple, Tuple[contextvars.Context, Dict[Tuple, "DataLoader"]]]] = {}
+    __tasks: Set[asyncio.Task] = set()
+
+    def __init__(
+            self,
+            key: Tuple,
+            fetch: Callable[[List], Awaitable[List[Any]]],
+            identify: Callable[[Any], Hashable],
+    ) -> None:
+        self.__fetch = fetch
+        self.__identify = identify
+        self.__futures: Dict[Hashable, Tuple[Any, List[asyncio.Future]]] = {}
+
+    @staticmethod
+    def scope(context: contextvars.Context) -> Tuple:
+        # Callers only share a batch when they see the same context values, so a batch never
+        # runs under another request's identity map, unit of work or connection.
+        return tuple(sorted((id(variable), id(value)) for variable, value in context.items()))
+
+    @classmethod
+    def batch(
+            cls,
+            key: Tuple,
+            fetch: Callable[[List], Awaitable[List[Any]]],
+            identify: Callable[[Any], Hashable],
+    ) -> "DataLoader":
+        # Every load made before the loop gets to run the dispatch callback ends up in a batch,
+        # the batches of one scope then run one after another as they usually share a connection.
+        loop = asyncio.get_running_loop()
+        if loop not in cls.__batches:
+            cls.__batches[loop] = {}
+            loop.call_soon(cls.dispatch, loop)
+
+        context = contextvars.copy_context()
+        _, batches = cls.__batches[loop].setdefault(cls.scope(context), (context, {}))
+        if key not in batches:
+            batches[key] = cls(key, fetch, identify)
+        return batches[key]
+
+    @classmethod
+    def dispatch(cls, loop: asyncio.AbstractEventLoop) -> None:
+        scopes = [(context, list(batches.values())) for context, batches in cls.__batches.pop(loop, {}).values()]
+
+        async def run_scope(loaders: List["DataLoader"]):
+            for loader in loaders:
+                await loader.run()
+
+        async def run():
+            # Each scope runs in a task created inside its callers' context, one scope after
+            # another as they may still share a connection.
+            for context, loaders in scopes:
+                await context.run(loop.create_task, run_scope(loaders))
+
+        # The loop only keeps weak references to tasks.
+        task = loop.create_task(run())
+        cls.__tasks.add(task)
+        task.add_done_callback(cls.__tasks.discard)
+
+    def load(self, identifier: Any) -> asyncio.Future:
+        future = asyncio.get_running_loop().create_future()
+        self.__futures.setdefault(str(identifier), (identifier, []))[1].append(future)
+        return future
+
+    async def run(self) -> None:
+        try:
+            results = await self.__fetch([identifier for identifier, _ in self.__futures.values()])
+        except Exception as ex:
+            for _, futures in self.__futures.values():
+                for future in futures:
+                    if not future.done():
+                        future.set_exception(ex)
+            return
+
+        results = {str(self.__identify(result)): result for result in results}
+        for key, (_, futures) in self.__futures.items():
+            for future in futures:
+                if not future.done():
+                    future.set_result(results.get(key))
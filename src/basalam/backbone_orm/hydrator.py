@@ -0,0 +1,121 @@
+import copy
+import datetime
+import typing
+import uuid
+from decimal import Decimal
+from typing import Annotated, Any, Callable, Dict, FrozenSet, Iterable, List, Optional, Tuple, Type
+
+from pydantic import TypeAdapter
+
+from .model_abstract import ModelAbstract, T
+from .parameters import Parameters
+
+
+class Hydrator:
+    # Values asyncpg already decodes to these exact types need no further validation.
+    TRUSTED_TYPES = (
+        int,
+        float,
+        str,
+        bool,
+        bytes,
+        Decimal,
+        uuid.UUID,
+        datetime.datetime,
+        datetime.date,
+        datetime.time,
+        datetime.timedelta,
+    )
+
+    __hydrators: Dict[Tuple[Type[ModelAbstract], FrozenSet[str]], "Hydrator"] = {}
+
+    def __init__(self, model_class: Type[ModelAbstract], validated: Iterable[str] = ()) -> None:
+        self.__model_class = model_class
+        self.__fields: List[Tuple[str, Optional[Tuple[type, ...]], Optional[Callable[[], Any]]]] = []
+        self.__adapters: Dict[str, TypeAdapter] = {}
+        self.__required = set()
+
+        # Validators, aliases, private attributes, post-init hooks and model-level strict mode only
+        # apply through full validation, such models are always validated.
+        decorators = model_class.__pydantic_decorators__
+        self.__trusted = not (
+                decorators.validators
+                or decorators.field_validators
+                or decorators.root_validators
+                or decorators.model_validators
+                or model_class.__private_attributes__
+                or model_class.__pydantic_post_init__
+                or model_class.model_config.get("extra") == "allow"
+                or model_class.model_config.get("strict")
+        )
+
+        for name, field in model_class.model_fields.items():
+            if (
+                    field.alias is not None
+                    or field.validation_alias is not None
+                    or getattr(field, "default_factory_takes_data", False)
+            ):
+                self.__trusted = False
+            if field.is_required():
+                self.__required.add(name)
+
+            types = self.trusted_types(field.annotation)
+            if name in validated or len(field.metadata) > 0:
+                types = None
+            self.__fields.append((name, types, None if field.is_required() else self.default(field)))
+
+    @classmethod
+    def of(cls, model_class: Type[ModelAbstract], validated: Iterable[str] = ()) -> "Hydrator":
+        key = (model_class, frozenset(validated))
+        if key not in cls.__hydrators:
+            cls.__hydrators[key] = cls(model_class, key[1])
+        return cls.__hydrators[key]
+
+    @classmethod
+    def trusted_types(cls, annotation: Any) -> Optional[Tuple[type, ...]]:
+        types = typing.get_args(annotation) if typing.get_origin(annotation) in Parameters.UNION_TYPES else (annotation,)
+        if all(item is type(None) or item in cls.TRUSTED_TYPES for item in types):
+            return tuple(types)
+        return None
+
+    @staticmethod
+    def default(field) -> Callable[[], Any]:
+        if field.default_factory is not None:
+            return field.default_factory
+
+        default = field.default
+        if isinstance(default, (dict, list, set)):
+            return (lambda: copy.deepcopy(default)) if default else default.copy
+        return lambda: default
+
+    def hydrate(self, row: Dict) -> T:
+        if not self.__trusted or not self.__required.issubset(row.keys()):
+            return self.__model_class(**row, x_original=dict(**row))
+
+        values = {}
+        fields_set = set()
+        for name, types, default in self.__fields:
+            if name == "x_original":
+                values[name] = dict(**row)
+            elif name in row:
+                value = row[name]
+                values[name] = value if types is not None and type(value) in types else self.validate(name, value)
+            else:
+                values[name] = default()
+                continue
+            fields_set.add(name)
+
+        # Same state model_construct leaves behind, without its per-call field introspection.
+        model = self.__model_class.__new__(self.__model_class)
+        object.__setattr__(model, "__dict__", values)
+        object.__setattr__(model, "__pydantic_fields_set__", fields_set)
+        object.__setattr__(model, "__pydantic_extra__", None)
+        object.__setattr__(model, "__pydantic_private__", None)
+        return model
+
+    def validate(self, name: str, value: Any) -> Any:
+        if name not in self.__adapters:
+            field = self.__model_class.model_fields[name]
+            annotation = Annotated[(field.annotation, *field.metadata)] if field.metadata else field.annotation
+            self.__adapters[name] = TypeAdapter(annotation)
+        return self.__adapters[name].validate_python(value)
@@ -0,0 +1,62 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, Iterator, Optional, Tuple, Type, TYPE_CHECKING
+
+from .model_abstract import ModelAbstract
+
+if TYPE_CHECKING:
+    from basalam.backbone_orm.repository_abstract import RepositoryAbstract
+
+
+class IdentityMap:
+    __models: ContextVar[Optional[Dict[Tuple[Type, str], ModelAbstract]]] = ContextVar(
+        "backbone_orm_identity_map", default=None
+    )
+
+    @classmethod
+    @contextmanager
+    def scope(cls) -> Iterator[None]:
+        token = cls.__models.set({})
+        try:
+            yield
+        finally:
+            cls.__models.reset(token)
+
+    @classmethod
+    def active(cls) -> bool:
+        return cls.__models.get() is not None
+
+    @staticmethod
+    def key(repository: Type["RepositoryAbstract"], identifier: Any) -> Tuple[Type, str]:
+        # Identifiers arrive both as ints and as their string form through relations.
+        return repository, str(identifier)
+
+    @classmethod
+    def get(cls, repository: Type["RepositoryAbstract"], identifier: Any) -> Optional[ModelAbstract]:
+        models = cls.__models.get()
+        return None if models is None else models.get(cls.key(repository, identifier))
+
+    @classmethod
+    def put(cls, repository: Type["RepositoryAbstract"], identifier: Any, model: ModelAbstract) -> None:
+        models = cls.__models.get()
+        if models is not None:
+            models[cls.key(repository, identifier)] = model
+
+    @classmethod
+    def forget(cls, repository: Type["RepositoryAbstract"], identifier: Any = None) -> None:
+        models = cls.__models.get()
+        if models is None:
+            return
+
+        if identifier is not None:
+            models.pop(cls.key(repository, identifier), None)
+            return
+
+        for key in [key for key in models.keys() if key[0] is repository]:
+            del models[key]
+
+    @classmethod
+    def clear(cls) -> None:
+        models = cls.__models.get()
+        if models is not None:
+            models.clear()
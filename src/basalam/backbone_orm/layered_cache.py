@@ -0,0 +1,191 @@
+import asyncio
+import json
+import logging
+import time
+import uuid
+import weakref
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+from .repository_cache import RepositoryCache
+
+try:
+    from aioredis import Redis
+except Exception as ex:
+    from redis.asyncio import Redis
+
+
+class LocalCache:
+
+    def __init__(self, max_size: int = 1024, ttl_in_seconds: float = 5) -> None:
+        self.__max_size = max_size
+        self.__ttl_in_seconds = ttl_in_seconds
+        self.__values: "OrderedDict[str, Tuple[float, Any]]" = OrderedDict()
+        self.__hits = 0
+        self.__misses = 0
+        self.origin = uuid.uuid4().hex
+
+    @property
+    def hits(self) -> int:
+        return self.__hits
+
+    @property
+    def misses(self) -> int:
+        return self.__misses
+
+    def get(self, key: str) -> Tuple[bool, Any]:
+        item = self.__values.get(key)
+        if item is None or item[0] < time.monotonic():
+            if item is not None:
+                del self.__values[key]
+            self.__misses += 1
+            return False, None
+
+        self.__hits += 1
+        self.__values.move_to_end(key)
+        return True, item[1]
+
+    def set(self, key: str, value: Any, seconds: Optional[float] = None) -> None:
+        if self.__max_size <= 0:
+            return
+
+        ttl = self.__ttl_in_seconds if seconds is None else min(seconds, self.__ttl_in_seconds)
+        self.__values[key] = (time.monotonic() + ttl, value)
+        self.__values.move_to_end(key)
+
+        while len(self.__values) > self.__max_size:
+            self.__values.popitem(last=False)
+
+    def forget(self, key: str) -> None:
+        self.__values.pop(key, None)
+
+    def clear(self) -> None:
+        self.__values.clear()
+
+    def stats(self) -> Dict:
+        lookups = self.__hits + self.__misses
+        return dict(
+            size=len(self.__values),
+            max_size=self.__max_size,
+            ttl_in_seconds=self.__ttl_in_seconds,
+            hits=self.__hits,
+            misses=self.__misses,
+            hit_rate=self.__hits / lookups if lookups > 0 else 0.0,
+        )
+
+    def __contains__(self, key: str) -> bool:
+        item = self.__values.get(key)
+        return item is not None and item[0] >= time.monotonic()
+
+    def __len__(self) -> int:
+        return len(self.__values)
+
+
+class LayeredCache(RepositoryCache):
+    CHANNEL = "BACKBONE_ORM.CACHE.INVALIDATE"
+
+    __local_caches: "weakref.WeakSet[LocalCache]" = weakref.WeakSet()
+    __listeners: Dict[Tuple[asyncio.AbstractEventLoop, int], asyncio.Task] = {}
+
+    def __init__(self, local: LocalCache, *args, **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+        self.__local = local
+        LayeredCache.__local_caches.add(local)
+
+    @property
+    def local(self) -> LocalCache:
+        return self.__local
+
+    async def get(self, key: str, default=None) -> Any:
+        return (await self.mget([key], default))[0]
+
+    async def mget(self, keys: List[str], default=None) -> List[Any]:
+        self.listen(self._connection)
+        found = [self.__local.get(self._prefix + key) for key in keys]
+        missing = [key for key, (hit, _) in zip(keys, found) if not hit]
+
+        payloads = {}
+        if len(missing) > 0:
+            self._trigger("MGET", missing)
+            results = await self._connection.mget([self._prefix + key for key in missing])
+            for key, payload in zip(missing, results):
+                payloads[key] = payload
+                if payload is not None:
+                    self.__local.set(self._prefix + key, payload)
+
+        return [
+            self._safe_deserialize(key, payload if hit else payloads[key], default)
+            for key, (hit, payload) in zip(keys, found)
+        ]
+
+    async def set(self, key: str, value: Any, seconds: Optional[int] = None) -> None:
+        await self.mset({key: value}, seconds)
+
+    async def mset(self, dictionary: Dict[str, Any], seconds: Optional[int] = None) -> None:
+        self.listen(self._connection)
+        self._trigger("MSET", list(dictionary.keys()))
+        pipe = self._connection.pipeline()
+        for key, value in dictionary.items():
+            payload = self._serialize(value)
+            self.__local.set(self._prefix + key, payload, seconds)
+            await pipe.set(self._prefix + key, payload, ex=seconds)
+        await pipe.execute()
+        await self.publish(list(dictionary.keys()))
+
+    async def forget(self, key) -> None:
+        self.__local.forget(self._prefix + key)
+        await super().forget(key)
+        await self.publish([key])
+
+    async def unlink(self, keys: List[str]) -> None:
+        for key in keys:
+            self.__local.forget(self._prefix + key)
+        await super().unlink(keys)
+        await self.publish(keys)
+
+    async def flush(self) -> None:
+        # Flushing empties Redis as a whole, every local tier drops everything it holds.
+        for local in list(LayeredCache.__local_caches):
+            local.clear()
+        await super().flush()
+        await self._connection.publish(self.CHANNEL, json.dumps({"o": self.__local.origin, "k": None}))
+
+    async def publish(self, keys: List[str]) -> None:
+        if len(keys) > 0:
+            await self._connection.publish(
+                self.CHANNEL,
+                json.dumps({"o": self.__local.origin, "k": [self._prefix + key for key in keys]}),
+            )
+
+    @classmethod
+    def invalidate(cls, message: Dict) -> None:
+        for local in list(cls.__local_caches):
+            if local.origin == message["o"]:
+                continue
+            if message["k"] is None:
+                local.clear()
+            for key in message["k"] or []:
+                local.forget(key)
+
+    @classmethod
+    def listen(cls, connection: Redis) -> None:
+        key = (asyncio.get_running_loop(), id(connection))
+        listener = cls.__listeners.get(key)
+        if listener is None or listener.done():
+            cls.__listeners[key] = asyncio.get_running_loop().create_task(cls.__listen(connection))
+
+    @classmethod
+    async def __listen(cls, connection: Redis) -> None:
+        pubsub = connection.pubsub()
+        try:
+            await pubsub.subscribe(cls.CHANNEL)
+            async for message in pubsub.listen():
+                if message.get("type") == "message":
+                    cls.invalidate(json.loads(message["data"]))
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            # Entries still expire on their own, the next cache operation resubscribes.
+            logging.getLogger(__name__).exception("Cache invalidation listener stopped")
+            for local in list(cls.__local_caches):
+                local.clear()
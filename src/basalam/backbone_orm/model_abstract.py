@@ -18,6 +18,7 @@ class ModelAbstract(BaseModel, abc.ABC):
     x_applied_relations: Set[str] = set()
     x_original: Dict = {}
     x_relations: Dict = {}
+    x_aggregates: Dict = {}
     model_config = ConfigDict(validate_assignment=True)
 
     def dict(self, **kwargs):
@@ -86,5 +87,11 @@ class ModelAbstract(BaseModel, abc.ABC):
     def has_relations(self, names: List[str]):
         return all(name in self.x_relations.keys() for name in names)
 
+    def set_aggregate(self, name, value):
+        self.x_aggregates[name] = value
+
+    def aggregate(self, name: str, default=None):
+        return self.x_aggregates.get(name, default)
+
 
 T = TypeVar("T", bound=ModelAbstract)
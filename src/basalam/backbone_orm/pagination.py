@@ -1,24 +1,44 @@
+import base64
+import binascii
+import datetime
+import json
+import uuid
 from abc import ABC, abstractmethod
-from typing import List, Type, Callable, Dict, Optional
+from decimal import Decimal
+from typing import List, Type, Callable, Dict, Optional, Any, Tuple
 
+from .concurrent_executor import ConcurrentExecutor
 from .repository_abstract import RepositoryAbstract
 from .parameters import Parameters
-from pydantic import ConfigDict, BaseModel, Field
-from pypika import functions, Query
+from pydantic import ConfigDict, BaseModel, Field, model_serializer
+from pypika import functions, Query, Order, Tuple as TupleTerm
 from pypika.queries import QueryBuilder
 
 
+class InvalidCursorException(Exception):
+    pass
+
+
 class PaginationResponse(BaseModel, ABC):
     data: List
-    total: int
+    total: Optional[int] = None
     per_page: int
     current_page: int
-    last_page: int
+    last_page: Optional[int] = None
+    has_more: Optional[bool] = None
     from_: int = Field(alias='from')
     to: int
 
     model_config = ConfigDict(populate_by_name=True)
 
+    @model_serializer(mode="wrap")
+    def serialize(self, handler) -> Dict:
+        # has_more is only part of the payload for pages made with with_count=False.
+        data = handler(self)
+        if self.has_more is None:
+            data.pop("has_more", None)
+        return data
+
     @classmethod
     @abstractmethod
     def repo(cls) -> Type[RepositoryAbstract]: pass
@@ -30,6 +50,10 @@ class PaginationResponse(BaseModel, ABC):
     @classmethod
     def relations(cls) -> List[str]: pass
 
+    @classmethod
+    def mapper_concurrency(cls) -> int:
+        return 1
+
     @classmethod
     async def make(
             cls,
@@ -39,10 +63,55 @@ class PaginationResponse(BaseModel, ABC):
             aggregate_query: Optional[QueryBuilder] = None,
             params: Optional[Parameters] = None,
             append: Dict = None,
+            with_count: bool = True,
     ) -> "PaginationResponse":
-        main_query = query.__copy__().limit(per_page).offset((page - 1) * per_page)
-        entities = await (cls.repo()).get(query=main_query, params=params, relations=cls.relations())
+        connection = await (cls.repo()).connection()
+
+        if with_count:
+            main_query = query.__copy__().limit(per_page).offset((page - 1) * per_page)
+            entities, aggregations = await ConcurrentExecutor.gather(
+                connection,
+                [
+                    lambda: (cls.repo()).get(query=main_query, params=params, relations=cls.relations()),
+                    lambda: cls.aggregate(query, aggregate_query, params),
+                ],
+                2,
+            )
+            has_more = None
+            last_page = int(aggregations['total'] / per_page) + 1
+        else:
+            main_query = query.__copy__().limit(per_page + 1).offset((page - 1) * per_page)
+            entities = await (cls.repo()).get(query=main_query, params=params, relations=cls.relations())
+            has_more = len(entities) > per_page
+            entities = entities[:per_page]
+            aggregations = {}
+            last_page = None
 
+        data = await ConcurrentExecutor.gather(
+            connection,
+            [lambda entity=entity: (cls.mapper())(entity) for entity in entities],
+            cls.mapper_concurrency(),
+        )
+
+        return cls(
+            data=data,
+            **aggregations,
+            per_page=per_page,
+            current_page=page,
+            last_page=last_page,
+            has_more=has_more,
+            from_=((page - 1) * per_page) + 1,
+            to=((page - 1) * per_page) + len(entities),
+            **(append or {})
+        )
+
+    @classmethod
+    async def aggregate(
+            cls,
+            query: QueryBuilder,
+            aggregate_query: Optional[QueryBuilder] = None,
+            params: Optional[Parameters] = None,
+    ) -> Dict:
         if aggregate_query is None:
             aggregate_query = query.__copy__()
             aggregate_query._orderbys = []
@@ -56,18 +125,7 @@ class PaginationResponse(BaseModel, ABC):
 
         aggregations = (await (cls.repo()).execute_and_fetch(query=aggregate_query, params=params))
 
-        aggregations = aggregations[0] if aggregations else {'total': 0}
-
-        return cls(
-            data=[await (cls.mapper())(entity) for entity in entities],
-            **aggregations,
-            per_page=per_page,
-            current_page=page,
-            last_page=int(aggregations['total'] / per_page) + 1,
-            from_=((page - 1) * per_page) + 1,
-            to=((page - 1) * per_page) + len(entities),
-            **(append or {})
-        )
+        return aggregations[0] if aggregations else {'total': 0}
 
     @classmethod
     async def resource(
@@ -78,6 +136,7 @@ class PaginationResponse(BaseModel, ABC):
             aggregate_query: Optional[QueryBuilder] = None,
             params: Optional[Parameters] = None,
             append: Dict = None,
+            with_count: bool = True,
     ) -> Dict:
         return (await cls.make(
             query=query,
@@ -86,4 +145,154 @@ class PaginationResponse(BaseModel, ABC):
             per_page=per_page,
             params=params,
             append=append,
+            with_count=with_count,
         )).dict(by_alias=True)
+
+
+class CursorPaginationResponse(BaseModel, ABC):
+    data: List
+    per_page: int
+    has_more: bool
+    next_cursor: Optional[str] = None
+    prev_cursor: Optional[str] = None
+
+    @classmethod
+    @abstractmethod
+    def repo(cls) -> Type[RepositoryAbstract]: pass
+
+    @classmethod
+    @abstractmethod
+    def mapper(cls) -> Callable: pass
+
+    @classmethod
+    def relations(cls) -> List[str]: pass
+
+    @classmethod
+    def mapper_concurrency(cls) -> int:
+        return 1
+
+    @classmethod
+    def cursor_columns(cls) -> List[str]:
+        # Must be unique as a whole, e.g. [created_at, id]; all columns are sorted in the same direction.
+        return [cls.repo().identifier()]
+
+    @classmethod
+    def descending(cls) -> bool:
+        return False
+
+    @classmethod
+    async def make(
+            cls,
+            query: QueryBuilder,
+            per_page: int,
+            cursor: Optional[str] = None,
+            params: Optional[Parameters] = None,
+            append: Dict = None,
+    ) -> "CursorPaginationResponse":
+        direction, values = cls.decode_cursor(cursor) if cursor else ("next", None)
+        backwards = direction == "prev"
+        descending = cls.descending() != backwards
+
+        params = Parameters(*(params.values() if params is not None else []))
+        fields = [cls.repo().field(column) for column in cls.cursor_columns()]
+
+        main_query = query.__copy__()
+        main_query._orderbys = []
+        if values is not None:
+            keys = TupleTerm(*fields)
+            bindings = TupleTerm(*params.make_many(values))
+            main_query = main_query.where(keys < bindings if descending else keys > bindings)
+        for field in fields:
+            main_query = main_query.orderby(field, order=Order.desc if descending else Order.asc)
+        main_query = main_query.limit(per_page + 1)
+
+        entities = await (cls.repo()).get(query=main_query, params=params, relations=cls.relations())
+
+        has_extra = len(entities) > per_page
+        entities = entities[:per_page]
+        if backwards:
+            entities.reverse()
+
+        if backwards:
+            next_cursor = cls.encode_cursor("next", entities[-1]) if entities else None
+            prev_cursor = cls.encode_cursor("prev", entities[0]) if has_extra else None
+        else:
+            next_cursor = cls.encode_cursor("next", entities[-1]) if has_extra else None
+            prev_cursor = cls.encode_cursor("prev", entities[0]) if cursor and entities else None
+
+        data = await ConcurrentExecutor.gather(
+            await (cls.repo()).connection(),
+            [lambda entity=entity: (cls.mapper())(entity) for entity in entities],
+            cls.mapper_concurrency(),
+        )
+
+        return cls(
+            data=data,
+            per_page=per_page,
+            has_more=next_cursor is not None,
+            next_cursor=next_cursor,
+            prev_cursor=prev_cursor,
+            **(append or {})
+        )
+
+    @classmethod
+    async def resource(
+            cls,
+            query: QueryBuilder,
+            per_page: int,
+            cursor: Optional[str] = None,
+            params: Optional[Parameters] = None,
+            append: Dict = None,
+    ) -> Dict:
+        return (await cls.make(
+            query=query,
+            per_page=per_page,
+            cursor=cursor,
+            params=params,
+            append=append,
+        )).dict()
+
+    @classmethod
+    def encode_cursor(cls, direction: str, entity: Any) -> str:
+        values = [cls.encode_value(entity.x_original.get(column)) for column in cls.cursor_columns()]
+        payload = json.dumps(dict(d=direction, v=values), separators=(",", ":"))
+        return base64.urlsafe_b64encode(payload.encode()).decode()
+
+    @classmethod
+    def decode_cursor(cls, cursor: str) -> Tuple[str, List]:
+        try:
+            payload = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+            direction, values = payload["d"], [cls.decode_value(value) for value in payload["v"]]
+        except (binascii.Error, ValueError, KeyError, TypeError) as exception:
+            raise InvalidCursorException(f"Invalid cursor {cursor!r}: {exception}")
+
+        if direction not in ("next", "prev") or len(values) != len(cls.cursor_columns()):
+            raise InvalidCursorException(f"Invalid cursor {cursor!r}")
+
+        return direction, values
+
+    @staticmethod
+    def encode_value(value: Any) -> Any:
+        if isinstance(value, datetime.datetime):
+            return {"datetime": value.isoformat()}
+        if isinstance(value, datetime.date):
+            return {"date": value.isoformat()}
+        if isinstance(value, Decimal):
+            return {"decimal": str(value)}
+        if isinstance(value, uuid.UUID):
+            return {"uuid": str(value)}
+        return value
+
+    @staticmethod
+    def decode_value(value: Any) -> Any:
+        if not isinstance(value, dict):
+            return value
+        if "datetime" in value:
+            return datetime.datetime.fromisoformat(value["datetime"])
+        if "date" in value:
+            return datetime.date.fromisoformat(value["date"])
+        if "decimal" in value:
+            return Decimal(value["decimal"])
+        if "uuid" in value:
+            return uuid.UUID(value["uuid"])
+        raise ValueError(f"Unknown cursor value {value!r}")
@@ -1,9 +1,27 @@
-from typing import List, Any, Iterable
+import types
+import typing
+import uuid
+from decimal import Decimal
+from typing import List, Any, Iterable, Optional, Callable, Tuple
 
-from pypika import Parameter
+from pypika import Parameter, functions
+from pypika.terms import Criterion, Term
 
 
 class Parameters:
+    # Postgres refuses statements with more bind parameters than this.
+    LIMIT = 32767
+
+    # PEP 604 unions (int | None) have their own origin from Python 3.10 on.
+    UNION_TYPES = (typing.Union, getattr(types, "UnionType", typing.Union))
+
+    ARRAY_TYPES = {
+        int: "bigint",
+        str: "text",
+        Decimal: "numeric",
+        uuid.UUID: "uuid",
+    }
+
     def __init__(self, *args) -> None:
         self.__params: List = list()
         for arg in args:
@@ -21,3 +39,34 @@ class Parameters:
 
     def bindings(self):
         return [Parameter(f"${index + 1}") for index, value in enumerate(self.__params)]
+
+    @staticmethod
+    def chunks(values: Iterable, size: int) -> List[List]:
+        values = list(values)
+        size = max(1, size)
+        return [values[index:index + size] for index in range(0, len(values), size)]
+
+    @classmethod
+    def array_type(cls, annotation: Any) -> Optional[str]:
+        arguments = [argument for argument in typing.get_args(annotation) if argument is not type(None)]
+        if typing.get_origin(annotation) in cls.UNION_TYPES and len(arguments) == 1:
+            annotation = arguments[0]
+        return cls.ARRAY_TYPES.get(annotation)
+
+    @staticmethod
+    def membership(
+            field: Term, values: Iterable, array_type: Optional[str] = None
+    ) -> Tuple[List, Callable[[List[Parameter]], Criterion]]:
+        # Binding the whole set as one array keeps the statement text constant whatever its length.
+        values = list(values)
+        if array_type is None:
+            return values, lambda bindings: field.isin(bindings)
+
+        if array_type == "bigint":
+            values = [int(value) if isinstance(value, str) else value for value in values]
+        elif array_type == "text":
+            values = [value if isinstance(value, str) else str(value) for value in values]
+
+        return [values], lambda bindings: field.eq(
+            functions.Function("ANY", functions.Cast(bindings[0], f"{array_type}[]"))
+        )
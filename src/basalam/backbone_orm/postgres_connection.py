@@ -1,11 +1,16 @@
+import logging
 import traceback
+from contextlib import asynccontextmanager
 from time import time
-from typing import List, Tuple, Union, TYPE_CHECKING, Optional, Callable
+from typing import List, Tuple, Union, TYPE_CHECKING, Optional, Callable, Iterable, AsyncIterator, Dict, AsyncContextManager
 
 import asyncpg as asyncpg
+from asyncpg.prepared_stmt import PreparedStatement
 from asyncpg.transaction import Transaction
 from pydantic import BaseModel
 
+from .prepared_statement_cache import PreparedStatementCache
+
 if TYPE_CHECKING:
     from basalam.backbone_orm.postgres_transaction import PostgresTransaction
 
@@ -33,6 +38,8 @@ class PostgresConnection:
             debug_enabled: bool = False,
             allow_wildcard_queries: bool = False,
             transactions_enabled: bool = True,
+            prepared_statements: Optional[PreparedStatementCache] = None,
+            sibling_factory: Optional[Callable[[], AsyncContextManager["PostgresConnection"]]] = None,
     ) -> None:
         self.__connection: asyncpg.Connection = connection
         self.__transaction_level = 0
@@ -42,6 +49,8 @@ class PostgresConnection:
         self.__transactions_enabled: bool = transactions_enabled
         self.__active_transaction: Optional[Transaction] = None
         self.__active_transaction_callbacks: List[Callable] = []
+        self.__prepared_statements: Optional[PreparedStatementCache] = prepared_statements
+        self.__sibling_factory = sibling_factory
 
     @property
     def history(self):
@@ -53,6 +62,44 @@ class PostgresConnection:
     def disable_debug(self):
         self.__debug_enabled = False
 
+    @property
+    def prepared_statements(self) -> Optional[PreparedStatementCache]:
+        return self.__prepared_statements
+
+    def enable_prepared_statements(self, cache: Optional[PreparedStatementCache] = None):
+        self.__prepared_statements = cache or self.__prepared_statements or PreparedStatementCache()
+
+    def disable_prepared_statements(self):
+        self.__prepared_statements = None
+
+    async def prepare(self, query: str) -> PreparedStatement:
+        if self.__prepared_statements is None:
+            return await self.__connection.prepare(query)
+
+        statement = self.__prepared_statements.get(query)
+        if statement is None:
+            statement = await self.__connection.prepare(query)
+            self.__prepared_statements.put(query, statement)
+
+        return statement
+
+    async def prepare_many(self, queries: Iterable[str]) -> None:
+        for query in queries:
+            try:
+                await self.prepare(query)
+            except asyncpg.exceptions.PostgresError as exception:
+                logging.getLogger(__name__).warning(
+                    "Could not prepare statement %r: %s", query, exception
+                )
+
+    @property
+    def can_spawn_siblings(self) -> bool:
+        # Siblings can't see uncommitted writes, so work inside a transaction stays on this connection.
+        return self.__sibling_factory is not None and not self.is_in_transaction
+
+    def sibling(self) -> AsyncContextManager["PostgresConnection"]:
+        return self.__sibling_factory()
+
     def transaction(self, isolation: Optional[str] = None) -> "PostgresTransaction":
         from basalam.backbone_orm.postgres_transaction import PostgresTransaction
 
@@ -70,7 +117,10 @@ class PostgresConnection:
 
         start = time()
         try:
-            if fetch:
+            if self.__prepared_statements is not None and (fetch or len(params) > 0):
+                records = await self.__fetch_prepared(query, params)
+                results = [dict(result) for result in records] if fetch else None
+            elif fetch:
                 results = [
                     dict(result)
                     for result in await self.__connection.fetch(query, *params)
@@ -87,8 +137,79 @@ class PostgresConnection:
         ) as exception:
             raise QueryException(f"{exception} --- Executed Query: {query}", params)
 
-        execution_time = time() - start
+        self.__profile(query, params, time() - start)
+
+        return results
+
+    async def copy_records(
+            self,
+            table: str,
+            columns: List[str],
+            records: Iterable[Tuple],
+            schema: Optional[str] = None,
+    ) -> str:
+        start = time()
+        try:
+            result = await self.__connection.copy_records_to_table(
+                table, records=records, columns=columns, schema_name=schema
+            )
+        except (
+                asyncpg.exceptions.InterfaceError,
+                asyncpg.exceptions.NotNullViolationError,
+                asyncpg.exceptions.DataError,
+        ) as exception:
+            raise QueryException(f"{exception} --- Copied Table: {table}", columns)
+        self.__profile(f"COPY {table} ({', '.join(columns)}) FROM STDIN", [], time() - start)
+
+        return result
 
+    @asynccontextmanager
+    async def cursor(
+            self, query: str, params=None, chunk_size: int = 1000
+    ) -> AsyncIterator[AsyncIterator[List[Dict]]]:
+        if params is None:
+            params = []
+
+        # Server-side cursors only live inside a transaction. Without managed transactions the
+        # rows are fetched at once and handed out in chunks of the same size.
+        if not self.__transactions_enabled and not self.__connection.is_in_transaction():
+            rows = await self.execute_and_fetch(query, params)
+            yield self.__chunks(rows, chunk_size)
+            return
+
+        async with self.transaction():
+            start = time()
+            try:
+                cursor = await self.__connection.cursor(query, *params)
+            except (
+                    asyncpg.exceptions.PostgresSyntaxError,
+                    asyncpg.exceptions.UndefinedParameterError,
+                    asyncpg.exceptions.InterfaceError,
+                    asyncpg.exceptions.DataError,
+            ) as exception:
+                raise QueryException(f"{exception} --- Executed Query: {query}", params)
+            self.__profile(query, params, time() - start)
+
+            yield self.__fetch_cursor(cursor, chunk_size)
+
+    @staticmethod
+    async def __chunks(rows: List[Dict], chunk_size: int) -> AsyncIterator[List[Dict]]:
+        for index in range(0, len(rows), chunk_size):
+            yield rows[index:index + chunk_size]
+
+    @staticmethod
+    async def __fetch_cursor(cursor, chunk_size: int) -> AsyncIterator[List[Dict]]:
+        while True:
+            records = await cursor.fetch(chunk_size)
+            if len(records) == 0:
+                break
+
+            yield [dict(record) for record in records]
+
+            if len(records) < chunk_size:
+                break
+
+    def __profile(self, query: str, params, execution_time: float):
         if self.__debug_enabled:
             trace_back: List[traceback.FrameSummary] = traceback.extract_stack()
             traces = [f"{trace.filename}:{trace.lineno}" for trace in trace_back]
@@ -101,7 +222,17 @@ class PostgresConnection:
                 )
             )
 
-        return results
+    async def __fetch_prepared(self, query: str, params):
+        try:
+            return await (await self.prepare(query)).fetch(*params)
+        except (
+                asyncpg.exceptions.InvalidCachedStatementError,
+                asyncpg.exceptions.OutdatedSchemaCacheError,
+        ):
+            self.__prepared_statements.forget(query)
+            if self.is_in_transaction:
+                raise
+            return await (await self.prepare(query)).fetch(*params)
 
     async def execute_and_fetch(self, query: str, params=None):
         return await self.execute(query, params, fetch=True)
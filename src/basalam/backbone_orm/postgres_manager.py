@@ -1,7 +1,9 @@
 import asyncio
 from abc import ABC, abstractmethod
+from contextlib import asynccontextmanager
 from enum import Enum
-from typing import Optional, Dict, Any, Tuple
+from functools import partial
+from typing import Optional, Dict, Any, Tuple, List, Type, TYPE_CHECKING, AsyncIterator
 
 import asyncpg
 import testing.postgresql
@@ -10,6 +12,10 @@ from asyncpg.pool import PoolAcquireContext
 from pydantic.main import BaseModel
 
 from .postgres_connection import PostgresConnection
+from .prepared_statement_cache import PreparedStatementCache
+
+if TYPE_CHECKING:
+    from .repository_abstract import RepositoryAbstract
 
 
 class DriverEnum(Enum):
@@ -22,6 +28,7 @@ class ConnectionConfig(BaseModel):
     pool_min_size: int = 5
     pool_max_size: int = 25
     pool_acquire_timeout: int = 1
+    pool_sibling_limit: int = 4
     pool_max_inactive_connection_lifetime: int = 10
     user: str = ''
     password: str = ''
@@ -30,6 +37,7 @@ class ConnectionConfig(BaseModel):
     db: str = ''
     timeout: float = 1
     server_settings: Dict = dict(jit="off")
+    prepared_statement_cache_size: int = 0
     test_host: str = "127.0.0.1"
     test_user: str = "postgres"
     test_db: str = "test"
@@ -38,7 +46,12 @@ class ConnectionConfig(BaseModel):
 class DriverAbstract(ABC):
 
     def __init__(self, config: ConnectionConfig) -> None:
-        pass
+        self.warm_up_queries: List[str] = []
+
+    def prepared_statements(self, config: ConnectionConfig) -> Optional[PreparedStatementCache]:
+        if config.prepared_statement_cache_size <= 0:
+            return None
+        return PreparedStatementCache(config.prepared_statement_cache_size)
 
     @abstractmethod
     def acquire(self, *args, **kwargs) -> PostgresConnection:
@@ -70,7 +83,8 @@ class TestDriver(DriverAbstract):
                 database=self.__config.test_db,
                 timeout=self.__config.timeout,
                 server_settings=self.__config.server_settings,
-            )
+            ),
+            prepared_statements=self.prepared_statements(self.__config),
         )
         return self.__connection
 
@@ -88,18 +102,57 @@ class PoolDriver(DriverAbstract):
         self.__pool: Optional[asyncpg.Pool] = None
         self.__pool_lock = asyncio.Lock()
         self.__acquires: Dict[str, Tuple[PostgresConnection, PoolAcquireContext]] = {}
+        self.__prepared_statements: Dict[Connection, PreparedStatementCache] = {}
 
     async def acquire(self, key: Any) -> PostgresConnection:
         if key not in self.__acquires:
             connection = await (await self.pool()).acquire(timeout=self.__config.pool_acquire_timeout)
-            self.__acquires[key] = (PostgresConnection(connection=connection), connection)
+            self.__acquires[key] = (
+                PostgresConnection(
+                    connection=connection,
+                    prepared_statements=self.__connection_prepared_statements(connection),
+                    sibling_factory=partial(self.sibling, asyncio.Semaphore(self.__config.pool_sibling_limit)),
+                ),
+                connection,
+            )
         return self.__acquires[key][0]
 
+    def __connection_prepared_statements(self, connection) -> Optional[PreparedStatementCache]:
+        # Pool proxies are recreated on every acquire, statements live on the underlying connection.
+        connection = getattr(connection, "_con", connection)
+        if connection not in self.__prepared_statements:
+            prepared_statements = self.prepared_statements(self.__config)
+            if prepared_statements is None:
+                return None
+            # Cached statements reference their connection, so entries are dropped on close
+            # instead of waiting for the connection to be collected.
+            self.__prepared_statements[connection] = prepared_statements
+            connection.add_termination_listener(lambda _: self.__prepared_statements.pop(connection, None))
+        return self.__prepared_statements[connection]
+
+    async def __init_connection(self, connection: Connection) -> None:
+        prepared_statements = self.__connection_prepared_statements(connection)
+        if prepared_statements is not None and len(self.warm_up_queries) > 0:
+            await PostgresConnection(
+                connection, prepared_statements=prepared_statements
+            ).prepare_many(self.warm_up_queries)
+
     async def release(self, key: Any) -> None:
         if key in self.__acquires.keys():
             await (await self.pool()).release(self.__acquires[key][1])
             del self.__acquires[key]
 
+    @asynccontextmanager
+    async def sibling(self, budget: asyncio.Semaphore) -> AsyncIterator[PostgresConnection]:
+        # The budget is shared by every sibling of one acquired connection, however many
+        # concurrent loads it fans out.
+        async with budget:
+            key = object()
+            try:
+                yield await self.acquire(key)
+            finally:
+                await self.release(key)
+
     async def pool(self):
         if self.__is_creating_pool:
             await asyncio.sleep(0.1)
@@ -119,6 +172,7 @@ class PoolDriver(DriverAbstract):
                     database=self.__config.db,
                     timeout=self.__config.timeout,
                     server_settings=dict(**self.__config.server_settings),
+                    init=self.__init_connection,
                 )
                 self.__is_creating_pool = False
             except Exception as e:
@@ -145,7 +199,12 @@ class SingleDriver(DriverAbstract):
                 timeout=self.__config.timeout,
                 server_settings=dict(**self.__config.server_settings),
             )
-            self.__connection = (PostgresConnection(connection), connection)
+            postgres_connection = PostgresConnection(
+                connection, prepared_statements=self.prepared_statements(self.__config)
+            )
+            if postgres_connection.prepared_statements is not None:
+                await postgres_connection.prepare_many(self.warm_up_queries)
+            self.__connection = (postgres_connection, connection)
 
         return self.__connection[0]
 
@@ -173,3 +232,8 @@ class PostgresManager:
 
     def get_driver(self, driver: DriverEnum) -> DriverEnum:
         return self.__drivers[driver]
+
+    def prepare_on_connect(self, *repositories: Type["RepositoryAbstract"]) -> None:
+        queries = [query for repository in repositories for query in repository.warm_up_queries()]
+        for driver in self.__drivers.values():
+            driver.warm_up_queries.extend(query for query in queries if query not in driver.warm_up_queries)
@@ -0,0 +1,76 @@
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+from asyncpg.prepared_stmt import PreparedStatement
+
+
+class PreparedStatementCache:
+
+    def __init__(self, max_size: int = 100) -> None:
+        self.__max_size = max_size
+        self.__statements: "OrderedDict[str, PreparedStatement]" = OrderedDict()
+        self.__usages: Dict[str, int] = {}
+        self.__hits = 0
+        self.__misses = 0
+
+    @property
+    def max_size(self) -> int:
+        return self.__max_size
+
+    @property
+    def hits(self) -> int:
+        return self.__hits
+
+    @property
+    def misses(self) -> int:
+        return self.__misses
+
+    def get(self, query: str) -> Optional[PreparedStatement]:
+        statement = self.__statements.get(query)
+        if statement is None:
+            self.__misses += 1
+            return None
+
+        self.__hits += 1
+        self.__usages[query] += 1
+        self.__statements.move_to_end(query)
+        return statement
+
+    def put(self, query: str, statement: PreparedStatement) -> None:
+        if self.__max_size <= 0:
+            return
+
+        self.__statements[query] = statement
+        self.__statements.move_to_end(query)
+        self.__usages.setdefault(query, 0)
+
+        while len(self.__statements) > self.__max_size:
+            evicted, _ = self.__statements.popitem(last=False)
+            del self.__usages[evicted]
+
+    def forget(self, query: str) -> None:
+        self.__statements.pop(query, None)
+        self.__usages.pop(query, None)
+
+    def clear(self) -> None:
+        self.__statements.clear()
+        self.__usages.clear()
+
+    def hot(self, limit: int = 10) -> List[Tuple[str, int]]:
+        return sorted(self.__usages.items(), key=lambda item: item[1], reverse=True)[:limit]
+
+    def stats(self) -> Dict:
+        lookups = self.__hits + self.__misses
+        return dict(
+            size=len(self.__statements),
+            max_size=self.__max_size,
+            hits=self.__hits,
+            misses=self.__misses,
+            hit_rate=self.__hits / lookups if lookups > 0 else 0.0,
+        )
+
+    def __contains__(self, query: str) -> bool:
+        return query in self.__statements
+
+    def __len__(self) -> int:
+        return len(self.__statements)
@@ -1,9 +1,13 @@
 from abc import ABC, abstractmethod
-from typing import List, TYPE_CHECKING, Type, Optional, Callable, Any, Dict
+from typing import List, TYPE_CHECKING, Type, Optional, Callable, Any, Dict, Tuple, Iterable, Awaitable
 
-from pypika import Table, Field
+from pypika import Table, Field, Order, analytics, functions
+from pypika.dialects import PostgreSQLQuery
 from pypika.queries import QueryBuilder
+from pypika.terms import Criterion, Term
 
+from .cache_flight import CacheFlight
+from .concurrent_executor import ConcurrentExecutor
 from .parameters import Parameters
 
 if TYPE_CHECKING:
@@ -11,16 +15,158 @@ if TYPE_CHECKING:
     from basalam.backbone_orm.repository_abstract import RepositoryAbstract
 
 
+class RelationNotJoinableException(Exception):
+    pass
+
+
+class RelationNotAggregatableException(Exception):
+    pass
+
+
+class RelationIndex:
+
+    def __init__(self, results: List["ModelAbstract"], key: Callable[["ModelAbstract"], Any]) -> None:
+        # Keeps the int/str coercion of Relation.compare, a reference only meets its own type
+        # or the other side of the int/str pair.
+        self.__values: Dict[Any, List[Tuple[int, "ModelAbstract"]]] = {}
+        self.__integers: Dict[int, List[Tuple[int, "ModelAbstract"]]] = {}
+        self.__numeric_strings: Dict[int, List[Tuple[int, "ModelAbstract"]]] = {}
+
+        for position, result in enumerate(results):
+            value = key(result)
+            entry = (position, result)
+            self.__values.setdefault(value, []).append(entry)
+            if isinstance(value, int):
+                self.__integers.setdefault(value, []).append(entry)
+            elif isinstance(value, str):
+                number = self.to_int(value)
+                if number is not None:
+                    self.__numeric_strings.setdefault(number, []).append(entry)
+
+    @staticmethod
+    def to_int(value: str) -> Optional[int]:
+        try:
+            return int(value)
+        except ValueError:
+            return None
+
+    def get(self, reference: Any) -> List["ModelAbstract"]:
+        matches = self.__values.get(reference, [])
+
+        coerced = []
+        if isinstance(reference, int):
+            coerced = self.__numeric_strings.get(reference, [])
+        elif isinstance(reference, str):
+            number = self.to_int(reference)
+            coerced = self.__integers.get(number, []) if number is not None else []
+
+        if len(coerced) > 0:
+            matches = sorted(matches + coerced, key=lambda entry: entry[0])
+
+        return [result for _, result in matches]
+
+
 class Relation(ABC):
+    AGGREGATES = {
+        "count": functions.Count,
+        "exists": functions.Count,
+        "sum": functions.Sum,
+        "min": functions.Min,
+        "max": functions.Max,
+        "avg": functions.Avg,
+    }
+    # Cached in place of a missing result, so parents without related rows are hits too.
+    EMPTY = "x_empty"
 
     def __init__(self):
         self.relation_repo: Optional[RepositoryAbstract] = None
         self.query_callback: Optional[
             Callable[[QueryBuilder], QueryBuilder]
-        ] = lambda query: query
+        ] = Relation.default_query_callback
         self.attribute_getter: Optional[
             Callable[["ModelAbstract", "str"], Any]
         ] = self.default_attribute_getter
+        self.parent_limit: Optional[Tuple[int, Optional[str], bool]] = None
+        self.lock_seconds: float = 10
+        self.early_refresh_beta: float = 0
+        self.version_field: Optional[str] = None
+        self.empty_cache_time_in_seconds: int = 0
+
+    @staticmethod
+    def default_query_callback(query: QueryBuilder) -> QueryBuilder:
+        return query
+
+    @property
+    def has_query_callback(self) -> bool:
+        return self.query_callback is not Relation.default_query_callback
+
+    def compile_query(self, key: Tuple, compiler: Callable[[], QueryBuilder]) -> str:
+        if self.has_query_callback:
+            return compiler().get_sql()
+
+        return self.relation_repo.compiled_query(key, compiler)
+
+    async def fetch_chunked(
+            self, identifiers: Iterable, fetch: Callable[[List], Awaitable[List]]
+    ) -> List:
+        chunks = Parameters.chunks(identifiers, self.relation_repo.chunk_size())
+        results = await ConcurrentExecutor.gather(
+            await self.relation_repo.connection(),
+            [lambda chunk=chunk: fetch(chunk) for chunk in chunks],
+            self.relation_repo.chunk_concurrency(),
+        )
+        return [result for chunk_results in results for result in chunk_results]
+
+    def aggregate_source(self) -> Tuple[str, Term, Optional[str], QueryBuilder]:
+        # The parent attribute, the related column grouped on, its array type and the base query.
+        raise RelationNotAggregatableException(type(self).__name__)
+
+    async def aggregate(
+            self, models: List["ModelAbstract"], function: str = "count", column: Optional[str] = None
+    ) -> List[Any]:
+        parent_key, _, _, _ = self.aggregate_source()
+        references = [self.attribute_getter(model, parent_key) for model in models]
+        identifiers = {reference for reference in references if reference is not None}
+
+        rows = []
+        if len(identifiers) > 0:
+            rows = await self.fetch_chunked(
+                identifiers, lambda chunk: self.fetch_aggregate(chunk, function, column)
+            )
+
+        index = RelationIndex(rows, lambda row: row["x_key"])
+        values = []
+        for reference in references:
+            matches = index.get(reference) if reference is not None else []
+            value = matches[0]["x_value"] if len(matches) > 0 else None
+            if function == "exists":
+                value = value is not None and value > 0
+            elif function in ("count", "sum"):
+                value = value or 0
+            values.append(value)
+
+        return values
+
+    async def fetch_aggregate(self, identifiers: List, function: str, column: Optional[str]) -> List[Dict]:
+        _, key, array_type, query = self.aggregate_source()
+        values, condition = Parameters.membership(key, identifiers, array_type)
+        params = Parameters(*values)
+        value = self.AGGREGATES[function]("*" if column is None else self.relation_repo.field(column))
+        if function == "sum":
+            # Matches RepositoryAbstract.sum, a sum over no values is 0 rather than NULL.
+            value = functions.Coalesce(value, 0)
+        # Orders and pages added by the callback don't apply to the grouped rows.
+        query = self.query_callback(query).__copy__()
+        query._orderbys = []
+        query._limit = None
+        query._offset = None
+        query = (
+            query
+            .where(condition(params.bindings()))
+            .select(key.as_("x_key"), value.as_("x_value"))
+            .groupby(key)
+        )
+        return await self.relation_repo.execute_and_fetch(query, params)
 
     def default_attribute_getter(self, model: "ModelAbstract", key: str):
         parts: List[str] = key.split(".")
@@ -50,6 +196,55 @@ class Relation(ABC):
         self.attribute_getter = getter
         return self
 
+    def early_refresh(self, beta: float = 1.0) -> "Relation":
+        self.early_refresh_beta = beta
+        return self
+
+    def versioned(self, field: Optional[str] = None) -> "Relation":
+        self.version_field = field or self.local_repo.updated_at_field()
+        return self
+
+    def cache_empty(self, seconds: int = 60) -> "Relation":
+        self.empty_cache_time_in_seconds = seconds
+        return self
+
+    def caches_empty(self) -> bool:
+        return self.cache_time_in_seconds > 0 and self.empty_cache_time_in_seconds > 0
+
+    def is_empty(self, cached: Any) -> bool:
+        return isinstance(cached, str) and cached == self.EMPTY
+
+    def cache_flight(self, relation_name: str, models: List["ModelAbstract"]) -> CacheFlight:
+        keys = []
+        if self.cache_time_in_seconds > 0:
+            keys = [self.cache_key(model, relation_name) for model in models]
+        return CacheFlight(self.local_repo.cache, keys, self.lock_seconds, self.early_refresh_beta)
+
+    @property
+    def joinable(self) -> bool:
+        return False
+
+    def limit_per_parent(self, limit: int, order_by: Optional[str] = None, descending: bool = False) -> "Relation":
+        self.parent_limit = (limit, order_by, descending)
+        return self
+
+    def apply_parent_limit(self, query: QueryBuilder, partition: Term, table: Table) -> QueryBuilder:
+        if self.parent_limit is None:
+            return query
+
+        limit, order_by, descending = self.parent_limit
+        row_number = analytics.RowNumber().over(partition).orderby(
+            table.field(order_by or self.relation_repo.identifier()),
+            order=Order.desc if descending else Order.asc,
+        )
+        limited = query.select(row_number.as_("x_row_number")).as_("x_limited")
+        return (
+            PostgreSQLQuery.from_(limited)
+            .select("*")
+            .where(limited.field("x_row_number") <= limit)
+            .orderby(limited.field("x_row_number"))
+        )
+
     async def apply(self, key: str, model: "ModelAbstract") -> "ModelAbstract":
         return (await self.apply_many(key, [model]))[0]
 
@@ -106,51 +301,92 @@ class BelongsTo(Relation):
         for model in models:
             model.forget_relation(relation_name)
 
-        identifiers = await self.identifiers(relation_name, models)
+        async with self.cache_flight(relation_name, models) as flight:
+            identifiers = await self.identifiers(relation_name, models, flight)
 
-        if len(identifiers) == 0:
             results = []
-        else:
-            params = Parameters()
-            query = self.relation_repo.select_query(self.with_trashed)
-            query = query.where(
-                Field(self.local_key).isin(params.make_many(identifiers))
-            )
-            query = query.select("*")
-            query = self.query_callback(query)
-            results = await self.relation_repo.get(query, params=params)
+            if not self.has_query_callback and self.local_key == self.relation_repo.identifier():
+                results, identifiers = self.relation_repo.remembered_models(identifiers, self.with_trashed)
 
-        new_caches = {}
-        for model in models:
-            compare_fn = lambda result: self.compare(
-                self.attribute_getter(model, self.foreign_key),
-                result.__getattribute__(self.local_key),
-            )
-            matches = [result for result in results if compare_fn(result)]
+            if len(identifiers) > 0:
+                results += await self.fetch_chunked(identifiers, self.fetch)
 
-            if len(matches) > 0:
-                model.set_relation(relation_name, matches[0])
+            index = RelationIndex(results, lambda result: result.__getattribute__(self.local_key))
+            new_caches = {}
+            empty_caches = {}
+            for model in models:
+                reference = self.attribute_getter(model, self.foreign_key)
+                matches = index.get(reference)
 
-            if self.cache_time_in_seconds > 0 and len(matches) > 0:
-                new_caches[self.cache_key(model, relation_name)] = matches[0]
+                if len(matches) > 0:
+                    model.set_relation(relation_name, matches[0])
 
-        if len(new_caches.keys()) > 0:
-            await (await self.local_repo.cache()).mset(
-                new_caches, self.cache_time_in_seconds
-            )
+                if self.cache_time_in_seconds > 0 and len(matches) > 0:
+                    new_caches[self.cache_key(model, relation_name)] = matches[0]
+                elif self.caches_empty() and reference in identifiers:
+                    empty_caches[self.cache_key(model, relation_name)] = self.EMPTY
+
+            await flight.write(new_caches, self.cache_time_in_seconds)
+            await flight.write(empty_caches, self.empty_cache_time_in_seconds)
 
         return models
 
-    async def identifiers(self, relation_name: str, models: List["ModelAbstract"]):
+    async def fetch(self, identifiers: List) -> List["ModelAbstract"]:
+        values, condition = Parameters.membership(
+            Field(self.local_key), identifiers, self.relation_repo.array_type(self.local_key)
+        )
+        params = Parameters(*values)
+        query = self.compile_query(
+            ("belongs_to", self.local_key, len(values), self.with_trashed),
+            lambda: self.query_callback(
+                self.relation_repo.select_query(self.with_trashed)
+                .where(condition(params.bindings()))
+                .select("*")
+            ),
+        )
+        return await self.relation_repo.get(query, params=params)
+
+    def aggregate_source(self) -> Tuple[str, Term, Optional[str], QueryBuilder]:
+        return (
+            self.foreign_key,
+            self.relation_repo.field(self.local_key),
+            self.relation_repo.array_type(self.local_key),
+            self.relation_repo.select_query(self.with_trashed),
+        )
+
+    @property
+    def joinable(self) -> bool:
+        return "." not in self.foreign_key and self.attribute_getter == self.default_attribute_getter
+
+    async def join(self, relation_name: str, query: QueryBuilder) -> QueryBuilder:
+        if not self.joinable:
+            raise RelationNotJoinableException(relation_name)
+
+        related = self.query_callback(self.relation_repo.select_query(self.with_trashed).select("*"))
+        if self.local_key != self.relation_repo.identifier():
+            # A parent keeps a single related row, as apply_many keeps only the first match.
+            related = (
+                PostgreSQLQuery.from_(related.as_("x_rows"))
+                .select("*")
+                .distinct_on(self.local_key)
+                .orderby(self.local_key)
+            )
+
+        alias = related.as_(f"x_join_{relation_name}")
+        columns = await self.relation_repo.column_types()
+        return query.left_join(alias).on(
+            alias.field(self.local_key) == self.local_repo.field(self.foreign_key)
+        ).select(*[alias.field(column).as_(f"x_join__{relation_name}__{column}") for column in columns])
+
+    async def identifiers(self, relation_name: str, models: List["ModelAbstract"], flight: CacheFlight):
         if self.cache_time_in_seconds > 0:
             identifiers = []
-            cache_keys = [self.cache_key(model, relation_name) for model in models]
-            caches = await (await self.local_repo.cache()).mget(cache_keys)
+            caches = await flight.read()
             for index, model in enumerate(models):
-                if caches[index] is not None:
-                    model.set_relation(relation_name, caches[index])
-                else:
+                if caches[index] is None:
                     identifiers.append(self.attribute_getter(model, self.foreign_key))
+                elif not self.is_empty(caches[index]):
+                    model.set_relation(relation_name, caches[index])
         else:
             identifiers = [
                 self.attribute_getter(model, self.foreign_key) for model in models
@@ -164,8 +400,8 @@ class BelongsTo(Relation):
     def cache_key(self, model: "ModelAbstract", relation_key: str):
         table = self.local_repo.table_name()
         identifier = model.__getattribute__(self.local_repo.identifier())
-        # timestamp = model.__getattribute__(self.local_repo.updated_at_field()) if self.local_repo.updated_at_field() is not None else 0
-        return f"relation::belongs_to::{table}::{identifier}::{relation_key}"
+        key = f"relation::belongs_to::{table}::{identifier}::{relation_key}"
+        return self.local_repo.relation_cache_version_key(model, key, self.version_field)
 
     async def forget(self, model: "ModelAbstract", relation_key: str):
         await (await self.local_repo.cache()).forget(
@@ -211,14 +447,35 @@ class HasOne(Relation):
     async def apply_many(
             self, relation_name: str, models: List["ModelAbstract"]
     ) -> List["ModelAbstract"]:
-        return await BelongsTo(
+        return await self.belongs_to().apply_many(relation_name, models)
+
+    @property
+    def joinable(self) -> bool:
+        return self.belongs_to().joinable
+
+    async def join(self, relation_name: str, query: QueryBuilder) -> QueryBuilder:
+        return await self.belongs_to().join(relation_name, query)
+
+    def aggregate_source(self) -> Tuple[str, Term, Optional[str], QueryBuilder]:
+        return self.belongs_to().aggregate_source()
+
+    def belongs_to(self) -> BelongsTo:
+        relation = BelongsTo(
             self.local_repo,
             self.relation_repo,
             self.local_key,
             self.foreign_key,
             self.with_trashed,
             self.cache_time_in_seconds,
-        ).apply_many(relation_name, models)
+        ).callback(self.query_callback).early_refresh(self.early_refresh_beta)
+        relation.lock_seconds = self.lock_seconds
+        relation.version_field = self.version_field
+        relation.empty_cache_time_in_seconds = self.empty_cache_time_in_seconds
+
+        if self.attribute_getter != self.default_attribute_getter:
+            relation.with_attribute_getter(self.attribute_getter)
+
+        return relation
 
 
 class HasMany(Relation):
@@ -255,54 +512,70 @@ class HasMany(Relation):
         for model in models:
             model.forget_relation(relation_name)
 
-        identifiers = await self.identifiers(relation_name, models)
+        async with self.cache_flight(relation_name, models) as flight:
+            identifiers = await self.identifiers(relation_name, models, flight)
 
-        if len(identifiers) == 0:
-            results = []
-        else:
-            params = Parameters()
-            query = self.relation_repo.select_query(self.with_trashed)
-            query = query.where(
-                Field(self.foreign_key).isin(params.make_many(identifiers))
-            )
-            query = query.select("*")
-            query = self.query_callback(query)
-            results = await self.relation_repo.get(query, params)
+            if len(identifiers) == 0:
+                results = []
+            else:
+                results = await self.fetch_chunked(identifiers, self.fetch)
 
-        new_caches = {}
-        for model in models:
-            matches = [
-                result
-                for result in results
-                if self.compare(
-                    self.attribute_getter(model, self.local_key),
-                    self.attribute_getter(result, self.foreign_key),
-                )
-            ]
+            index = RelationIndex(results, lambda result: self.attribute_getter(result, self.foreign_key))
+            new_caches = {}
+            empty_caches = {}
+            for model in models:
+                reference = self.attribute_getter(model, self.local_key)
+                matches = index.get(reference)
 
-            if len(matches) > 0:
-                model.set_relation(relation_name, matches)
-            elif model.__getattribute__(self.local_repo.identifier()) in identifiers:
-                model.set_relation(relation_name, [])
+                if len(matches) > 0:
+                    model.set_relation(relation_name, matches)
+                elif model.__getattribute__(self.local_repo.identifier()) in identifiers:
+                    model.set_relation(relation_name, [])
 
-            if self.cache_time_in_seconds > 0 and len(matches) > 0:
-                new_caches[self.cache_key(model, relation_name)] = matches
+                if self.cache_time_in_seconds > 0 and len(matches) > 0:
+                    new_caches[self.cache_key(model, relation_name)] = matches
+                elif self.caches_empty() and reference in identifiers:
+                    empty_caches[self.cache_key(model, relation_name)] = self.EMPTY
 
-        if len(new_caches.keys()) > 0:
-            await (await self.local_repo.cache()).mset(
-                new_caches, self.cache_time_in_seconds
-            )
+            await flight.write(new_caches, self.cache_time_in_seconds)
+            await flight.write(empty_caches, self.empty_cache_time_in_seconds)
 
         return models
 
-    async def identifiers(self, relation_name: str, models: List["ModelAbstract"]):
+    def aggregate_source(self) -> Tuple[str, Term, Optional[str], QueryBuilder]:
+        return (
+            self.local_key,
+            self.relation_repo.field(self.foreign_key),
+            self.relation_repo.array_type(self.foreign_key),
+            self.relation_repo.select_query(self.with_trashed),
+        )
+
+    async def fetch(self, identifiers: List) -> List["ModelAbstract"]:
+        values, condition = Parameters.membership(
+            Field(self.foreign_key), identifiers, self.relation_repo.array_type(self.foreign_key)
+        )
+        params = Parameters(*values)
+        query = self.compile_query(
+            ("has_many", self.foreign_key, len(values), self.with_trashed, self.parent_limit),
+            lambda: self.apply_parent_limit(
+                self.query_callback(
+                    self.relation_repo.select_query(self.with_trashed)
+                    .where(condition(params.bindings()))
+                    .select("*")
+                ),
+                self.relation_repo.field(self.foreign_key),
+                self.relation_repo.table(),
+            ),
+        )
+        return await self.relation_repo.get(query, params)
+
+    async def identifiers(self, relation_name: str, models: List["ModelAbstract"], flight: CacheFlight):
         if self.cache_time_in_seconds > 0:
             identifiers = []
-            cache_keys = [self.cache_key(model, relation_name) for model in models]
-            caches = await (await self.local_repo.cache()).mget(cache_keys)
+            caches = await flight.read()
             for index, model in enumerate(models):
                 if caches[index] is not None:
-                    model.set_relation(relation_name, caches[index])
+                    model.set_relation(relation_name, [] if self.is_empty(caches[index]) else caches[index])
                 else:
                     identifiers.append(self.attribute_getter(model, self.local_key))
         else:
@@ -318,7 +591,8 @@ class HasMany(Relation):
     def cache_key(self, model: "ModelAbstract", relation_key: str):
         table = self.local_repo.table_name()
         identifier = model.__getattribute__(self.local_repo.identifier())
-        return f"relation::has_many::{table}::{identifier}::{relation_key}"
+        key = f"relation::has_many::{table}::{identifier}::{relation_key}"
+        return self.local_repo.relation_cache_version_key(model, key, self.version_field)
 
     async def forget(self, model: "ModelAbstract", relation_key: str):
         await (await self.local_repo.cache()).forget(
@@ -372,67 +646,102 @@ class BelongsToMany(Relation):
         for model in models:
             model.forget_relation(relation_name)
 
-        identifiers = await self.identifiers(relation_name, models)
+        async with self.cache_flight(relation_name, models) as flight:
+            identifiers = await self.identifiers(relation_name, models, flight)
 
-        if len(identifiers) == 0:
-            results = []
-        else:
-            params = Parameters()
-            pivot_table = Table(self.pivot_table, schema=self.pivot_schema if self.pivot_schema else self.relation_repo.schema_name())
-            relation_table = self.relation_repo.table()
-            query = self.relation_repo.select_query(self.with_trashed)
-            query = query.inner_join(pivot_table).on(
-                pivot_table.field(self.pivot_relation_key) == relation_table.field(self.relation_key)
-            )
-            query = self.query_callback(query)
-            query = query.where(
-                pivot_table.field(self.pivot_local_key).isin(
-                    params.make_many(identifiers)
-                )
-            )
-            query = query.select(
-                relation_table.star,
-                pivot_table.field(self.pivot_local_key).as_("x_ref"),
-            )
-            results = await self.relation_repo.get(query, params=params)
-
-        new_caches = {}
-
-        non_cache_models = [
-            model
-            for model in models
-            if model.__getattribute__(self.local_repo.identifier()) in identifiers
-        ]
-
-        for model in non_cache_models:
-            model.x_relations[relation_name] = list()
-            for result in results:
-                if self.compare(model.__getattribute__(self.local_key), result.x_ref):
-                    model.x_relations[relation_name].append(result)
-
-            if (
-                    self.cache_time_in_seconds > 0
-                    and len(model.x_relations[relation_name]) > 0
-            ):
-                new_caches[self.cache_key(model, relation_name)] = model.x_relations[
-                    relation_name
-                ]
-
-        if len(new_caches.keys()) > 0:
-            await (await self.local_repo.cache()).mset(
-                new_caches, self.cache_time_in_seconds
-            )
+            if len(identifiers) == 0:
+                results = []
+            else:
+                results = await self.fetch_chunked(identifiers, self.fetch)
+
+            new_caches = {}
+            empty_caches = {}
+
+            non_cache_models = [
+                model
+                for model in models
+                if model.__getattribute__(self.local_repo.identifier()) in identifiers
+            ]
+
+            index = RelationIndex(results, lambda result: result.x_ref)
+            for model in non_cache_models:
+                model.x_relations[relation_name] = index.get(model.__getattribute__(self.local_key))
+
+                if (
+                        self.cache_time_in_seconds > 0
+                        and len(model.x_relations[relation_name]) > 0
+                ):
+                    new_caches[self.cache_key(model, relation_name)] = model.x_relations[
+                        relation_name
+                    ]
+                elif self.caches_empty() and len(model.x_relations[relation_name]) == 0:
+                    empty_caches[self.cache_key(model, relation_name)] = self.EMPTY
+
+            await flight.write(new_caches, self.cache_time_in_seconds)
+            await flight.write(empty_caches, self.empty_cache_time_in_seconds)
 
         return models
 
-    async def identifiers(self, relation_key: str, models: List["ModelAbstract"]):
+    def aggregate_source(self) -> Tuple[str, Term, Optional[str], QueryBuilder]:
+        pivot_table = self.pivot()
+        query = self.relation_repo.select_query(self.with_trashed).inner_join(pivot_table).on(
+            pivot_table.field(self.pivot_relation_key) == self.relation_repo.table().field(self.relation_key)
+        )
+        return (
+            self.local_key,
+            pivot_table.field(self.pivot_local_key),
+            self.local_repo.array_type(self.local_key),
+            query,
+        )
+
+    async def fetch(self, identifiers: List) -> List["ModelAbstract"]:
+        values, condition = Parameters.membership(
+            self.pivot().field(self.pivot_local_key),
+            identifiers,
+            self.local_repo.array_type(self.local_key),
+        )
+        params = Parameters(*values)
+        query = self.compile_query(
+            (
+                "belongs_to_many",
+                self.pivot_schema,
+                self.pivot_table,
+                self.pivot_local_key,
+                self.pivot_relation_key,
+                self.relation_key,
+                len(values),
+                self.with_trashed,
+                self.parent_limit,
+            ),
+            lambda: self.query(condition(params.bindings())),
+        )
+        return await self.relation_repo.get(query, params=params)
+
+    def pivot(self) -> Table:
+        return Table(self.pivot_table, schema=self.pivot_schema if self.pivot_schema else self.relation_repo.schema_name())
+
+    def query(self, condition: Criterion) -> QueryBuilder:
+        pivot_table = self.pivot()
+        relation_table = self.relation_repo.table()
+        query = self.relation_repo.select_query(self.with_trashed)
+        query = query.inner_join(pivot_table).on(
+            pivot_table.field(self.pivot_relation_key) == relation_table.field(self.relation_key)
+        )
+        query = self.query_callback(query)
+        query = query.where(condition)
+        query = query.select(
+            relation_table.star,
+            pivot_table.field(self.pivot_local_key).as_("x_ref"),
+        )
+        return self.apply_parent_limit(query, pivot_table.field(self.pivot_local_key), relation_table)
+
+    async def identifiers(self, relation_key: str, models: List["ModelAbstract"], flight: CacheFlight):
         if self.cache_time_in_seconds > 0:
             identifiers = []
-            cache_keys = [self.cache_key(model, relation_key) for model in models]
-            caches = await (await self.local_repo.cache()).mget(cache_keys)
+            caches = await flight.read()
             for index, model in enumerate(models):
                 if caches[index] is not None:
-                    model.set_relation(relation_key, caches[index])
+                    model.set_relation(relation_key, [] if self.is_empty(caches[index]) else caches[index])
                 else:
                     identifiers.append(self.attribute_getter(model, self.local_key))
 
@@ -450,8 +759,8 @@ class BelongsToMany(Relation):
     def cache_key(self, model: "ModelAbstract", relation_key: str):
         table = self.local_repo.table_name()
         identifier = model.__getattribute__(self.local_repo.identifier())
-        # timestamp = model.__getattribute__(self.local_repo.updated_at_field()) if self.local_repo.updated_at_field() is not None else 0
-        return f"relation::belongs_to_many::{table}::{identifier}::{relation_key}"
+        key = f"relation::belongs_to_many::{table}::{identifier}::{relation_key}"
+        return self.local_repo.relation_cache_version_key(model, key, self.version_field)
 
     async def forget(self, model: "ModelAbstract", relation_key: str):
         await (await self.local_repo.cache()).forget(
@@ -0,0 +1,53 @@
+from typing import Dict, Iterable, List, Type, TYPE_CHECKING
+
+from .concurrent_executor import ConcurrentExecutor
+from .model_abstract import T
+from .relation_applier import RelationApplier
+
+if TYPE_CHECKING:
+    from basalam.backbone_orm.repository_abstract import RepositoryAbstract
+
+
+class RelationTree:
+
+    def __init__(self, name: str = "") -> None:
+        self.name = name
+        self.children: Dict[str, RelationTree] = {}
+
+    @classmethod
+    def parse(cls, relations: Iterable[str]) -> "RelationTree":
+        root = cls()
+        for relation in relations:
+            node = root
+            for name in relation.replace("_relation", "").split("."):
+                node = node.children.setdefault(name, cls(name))
+        return root
+
+    async def apply(self, repository: Type["RepositoryAbstract"], models: List[T]) -> None:
+        if len(models) == 0 or len(self.children) == 0:
+            return
+
+        # Sibling branches are independent, each one may run on its own pooled connection.
+        await ConcurrentExecutor.gather(
+            await repository.connection(),
+            [lambda child=child: child.load(repository, models) for child in self.children.values()],
+            repository.relation_concurrency(),
+        )
+
+    async def load(self, repository: Type["RepositoryAbstract"], models: List[T]) -> None:
+        applier = RelationApplier(repository, models, self.name)
+        await applier.apply()
+
+        if len(self.children) > 0:
+            relation_repo = getattr(repository, applier.filter_relation_name(self.name + "_relation"))().relation_repo
+            await self.apply(relation_repo, self.related_models(applier, models))
+
+    def related_models(self, applier: RelationApplier, models: List[T]) -> List[T]:
+        related = []
+        for model in models:
+            value = getattr(model, applier.filter_relation_name(self.name))
+            if isinstance(value, (list, set)):
+                related.extend(value)
+            elif value is not None:
+                related.append(value)
+        return related
@@ -1,7 +1,8 @@
+import asyncio
 import datetime
-import pickle
+import uuid
 from abc import ABC, abstractmethod
-from typing import Dict, List, Type, Union, Generic, Optional, Any, Callable, Iterable
+from typing import Dict, List, Type, Union, Generic, Optional, Any, Callable, Iterable, Tuple, AsyncIterator, Awaitable
 
 try:
     from aioredis import Redis
@@ -9,20 +10,34 @@ except Exception as ex:
     from redis.asyncio import Redis
 
 import inflect
-from basalam.backbone_redis_cache import RedisCache
-from pypika import Table, Field, functions
+from pypika import Table, Field, Parameter, Query, functions
+from pypika.dialects import PostgreSQLQuery
 from pypika.queries import QueryBuilder
 
+from .cache_codec import CacheCodec
+from .cache_flight import CacheFlight
+from .compiled_query_cache import CompiledQueryCache
+from .concurrent_executor import ConcurrentExecutor
+from .data_loader import DataLoader
+from .hydrator import Hydrator
+from .identity_map import IdentityMap
+from .layered_cache import LayeredCache, LocalCache
+from .unit_of_work import UnitOfWork
 from .model_schema_abstract import ModelSchemaAbstract
 from .parameters import Parameters
 from .postgres_connection import PostgresConnection
 from .relation_applier import RelationApplier
+from .relation_tree import RelationTree
+from .repository_cache import RepositoryCache
 from .query_builder_abstract import QueryBuilderAbstract, V
 from .model_abstract import T
-from .relation import Relation, BelongsTo, HasOne, HasMany, BelongsToMany
+from .relation import Relation, BelongsTo, HasOne, HasMany, BelongsToMany, RelationNotJoinableException
 
 
 class RepositoryAbstract(ABC, Generic[T, V]):
+    __compiled_queries: Dict[Type, CompiledQueryCache] = {}
+    __column_types: Dict[Tuple[str, str], Dict[str, str]] = {}
+    __local_caches: Dict[Type, LocalCache] = {}
 
     @classmethod
     @abstractmethod
@@ -34,6 +49,10 @@ class RepositoryAbstract(ABC, Generic[T, V]):
     async def redis(cls) -> Redis:
         pass
 
+    @classmethod
+    async def current_connection(cls) -> PostgresConnection:
+        return await ConcurrentExecutor.resolve(await cls.connection())
+
     @classmethod
     def query_builder(cls) -> QueryBuilderAbstract:
         return QueryBuilderAbstract()
@@ -44,14 +63,97 @@ class RepositoryAbstract(ABC, Generic[T, V]):
         pass
 
     @classmethod
-    async def cache(cls) -> RedisCache:
-        return RedisCache(
+    async def cache(cls) -> RepositoryCache:
+        codec = cls.cache_codec()
+        if cls.local_cache_size() > 0:
+            return LayeredCache(
+                cls.local_cache(),
+                connection=await cls.redis(),
+                prefix="BACKBONE_ORM.CACHE." + cls.table_name() + ".",
+                serializer=codec.serialize,
+                deserializer=codec.deserialize,
+            )
+
+        return RepositoryCache(
             connection=await cls.redis(),
             prefix="BACKBONE_ORM.CACHE." + cls.table_name() + ".",
-            serializer=pickle.dumps,
-            deserializer=pickle.loads,
+            serializer=codec.serialize,
+            deserializer=codec.deserialize,
         )
 
+    @classmethod
+    def cache_codec(cls) -> CacheCodec:
+        return CacheCodec()
+
+    @classmethod
+    def local_cache_size(cls) -> int:
+        return 0
+
+    @classmethod
+    def local_cache_ttl_in_seconds(cls) -> float:
+        return 5
+
+    @classmethod
+    def local_cache(cls) -> LocalCache:
+        if cls not in RepositoryAbstract.__local_caches:
+            RepositoryAbstract.__local_caches[cls] = LocalCache(
+                cls.local_cache_size(), cls.local_cache_ttl_in_seconds()
+            )
+        return RepositoryAbstract.__local_caches[cls]
+
+    @classmethod
+    def entity_cache_time_in_seconds(cls) -> int:
+        return 0
+
+    @classmethod
+    def entity_cache_enabled(cls) -> bool:
+        return cls.entity_cache_time_in_seconds() > 0
+
+    @classmethod
+    async def entity_cache_usable(cls) -> bool:
+        # A transaction has to see its own writes and must not publish rows it may roll back.
+        return cls.entity_cache_enabled() and not (await cls.current_connection()).is_in_transaction
+
+    @classmethod
+    def entity_cache_key(cls, identifier: Any) -> str:
+        return f"entity::{identifier}"
+
+    @classmethod
+    async def cached_rows(cls, identifiers: List) -> Tuple[List[Dict], List]:
+        cached = await (await cls.cache()).mget([cls.entity_cache_key(identifier) for identifier in identifiers])
+        rows = [row for row in cached if row is not None]
+        missing = [identifier for identifier, row in zip(identifiers, cached) if row is None]
+        return rows, missing
+
+    @classmethod
+    async def cache_rows(cls, rows: List[Dict]) -> None:
+        # Trashed rows are left out so a cached row is valid for both with and without trashed reads.
+        rows = {
+            cls.entity_cache_key(row[cls.identifier()]): row
+            for row in rows
+            if not cls.soft_deletes() or row.get(cls.soft_delete_identifier()) is None
+        }
+        if len(rows) > 0:
+            await (await cls.cache()).mset(rows, cls.entity_cache_time_in_seconds())
+
+    @classmethod
+    async def forget_cached_entities(cls, identifiers: Union[Any, List[Any]]) -> None:
+        identifiers = identifiers if isinstance(identifiers, List) else [identifiers]
+        if not cls.entity_cache_enabled() or len(identifiers) == 0:
+            return
+
+        keys = [cls.entity_cache_key(identifier) for identifier in identifiers]
+
+        async def forget():
+            await (await cls.cache()).unlink(keys)
+
+        # Runs after the write, readers outside a transaction may still re-cache the committed
+        # row until it commits, so the entries are dropped once more on commit.
+        await forget()
+        connection = await cls.current_connection()
+        if connection.is_in_transaction:
+            connection.add_transaction_callback(forget)
+
     @classmethod
     @abstractmethod
     def table_name(cls) -> str:
@@ -92,6 +194,16 @@ class RepositoryAbstract(ABC, Generic[T, V]):
     def created_at_field(cls) -> Optional[str]:
         return "created_at"
 
+    @classmethod
+    def relation_cache_version_field(cls) -> Optional[str]:
+        return None
+
+    @classmethod
+    def updated_at_value(cls) -> datetime.datetime:
+        # Keeps its microseconds, relation cache keys versioned by updated_at have to change on
+        # every write rather than once a second.
+        return datetime.datetime.now()
+
     @classmethod
     async def apply_default_relations(cls, models: List[T]) -> List[T]:
         return await cls.apply_relations(models, cls.default_relations())
@@ -108,10 +220,97 @@ class RepositoryAbstract(ABC, Generic[T, V]):
     def soft_delete_identifier(cls) -> str:
         return "deleted_at"
 
+    @classmethod
+    def use_identity_map(cls) -> bool:
+        return True
+
+    @classmethod
+    def identity_map_active(cls) -> bool:
+        return cls.use_identity_map() and IdentityMap.active()
+
     @classmethod
     def cast_to_models(cls, rows: List[Dict]) -> List[T]:
-        model_class = cls.model()
-        return [model_class(**row, x_original=dict(**row)) for row in rows]
+        models = cls.hydrate(rows)
+
+        unit_of_work = UnitOfWork.current()
+        if unit_of_work is not None:
+            unit_of_work.track(cls, models)
+
+        return models
+
+    @classmethod
+    def trusted_hydration(cls) -> bool:
+        return False
+
+    @classmethod
+    def hydrator(cls) -> Hydrator:
+        return Hydrator.of(cls.model(), cls.accessors().keys())
+
+    @classmethod
+    def hydrate(cls, rows: List[Dict]) -> List[T]:
+        if cls.trusted_hydration():
+            construct = cls.hydrator().hydrate
+        else:
+            model_class = cls.model()
+            construct = lambda row: model_class(**row, x_original=dict(**row))
+
+        if not cls.identity_map_active():
+            return [construct(row) for row in rows]
+
+        models = []
+        for row in rows:
+            # Pivot rows repeat a related row once per parent with its own x_ref, sharing one
+            # instance would leave every copy pointing at the last parent.
+            if row.get("x_ref") is not None:
+                models.append(construct(row))
+                continue
+
+            identifier = row.get(cls.identifier())
+            model = None if identifier is None else IdentityMap.get(cls, identifier)
+
+            if model is None:
+                model = construct(row)
+                if identifier is not None:
+                    IdentityMap.put(cls, identifier, model)
+            elif any(model.x_original.get(key) != value for key, value in row.items()):
+                cls.fill_model(model, row)
+                model.x_original = {**model.x_original, **row}
+
+            models.append(model)
+
+        return models
+
+    @classmethod
+    def remembered_models(
+            cls, identifiers: Iterable, with_thrashed: bool = False
+    ) -> Tuple[List[T], List]:
+        if not cls.identity_map_active():
+            return [], list(identifiers)
+
+        models, missing = [], []
+        for identifier in identifiers:
+            model = IdentityMap.get(cls, identifier)
+            if model is None or (not with_thrashed and cls.is_trashed(model)):
+                missing.append(identifier)
+            else:
+                models.append(model)
+
+        return models, missing
+
+    @classmethod
+    def is_trashed(cls, model: T) -> bool:
+        return cls.soft_deletes() and getattr(model, cls.soft_delete_identifier(), None) is not None
+
+    @classmethod
+    def forget_remembered(cls, identifiers: Optional[Union[Any, List[Any]]] = None) -> None:
+        if not cls.identity_map_active():
+            return
+
+        if identifiers is None:
+            return IdentityMap.forget(cls)
+
+        for identifier in identifiers if isinstance(identifiers, List) else [identifiers]:
+            IdentityMap.forget(cls, identifier)
 
     @classmethod
     def cast_to_model(cls, row: Dict) -> T:
@@ -179,46 +378,109 @@ class RepositoryAbstract(ABC, Generic[T, V]):
     async def apply_relations(
             cls, models: Union[T, List[T]], relations: Iterable[str]
     ) -> Union[T, List[T]]:
-        for relation in relations:
-            models = await cls.apply_relation(models, relation)
+        await RelationTree.parse(relations).apply(cls, models if isinstance(models, list) else [models])
+        return models
+
+    @classmethod
+    def relation_cache_version_key(cls, model: T, key: str, field: Optional[str] = None) -> str:
+        # With a version field the key follows the parent's row version, so any update that
+        # bumps it leaves the old entry behind to expire instead of deleting it.
+        field = field or cls.relation_cache_version_field()
+        if field is None:
+            return key
+
+        # isoformat keeps the key independent of the worker's timezone for naive datetimes.
+        version = model.__getattribute__(field)
+        if isinstance(version, (datetime.datetime, datetime.date)):
+            version = version.isoformat()
+        return f"{key}::v{version}"
 
+    @classmethod
+    def relation_concurrency(cls) -> int:
+        return 1
+
+    @classmethod
+    async def apply_relation_aggregates(
+            cls,
+            models: Union[T, List[T]],
+            relations: Iterable[str],
+            function: str = "count",
+            column: Optional[str] = None,
+    ) -> Union[T, List[T]]:
+        items = models if isinstance(models, list) else [models]
+        if len(items) == 0:
+            return models
+
+        async def aggregate(relation: str):
+            name = "_".join([relation, function] + ([column] if column is not None else []))
+            values = await getattr(cls, relation + "_relation")().aggregate(items, function, column)
+            for model, value in zip(items, values):
+                model.set_aggregate(name, value)
+
+        await ConcurrentExecutor.gather(
+            await cls.connection(),
+            [lambda relation=relation: aggregate(relation) for relation in relations],
+            cls.relation_concurrency(),
+        )
         return models
 
+    @classmethod
+    async def apply_relation_counts(cls, models: Union[T, List[T]], relations: Iterable[str]) -> Union[T, List[T]]:
+        return await cls.apply_relation_aggregates(models, relations, "count")
+
+    @classmethod
+    async def apply_relation_sums(
+            cls, models: Union[T, List[T]], relations: Iterable[str], column: str
+    ) -> Union[T, List[T]]:
+        return await cls.apply_relation_aggregates(models, relations, "sum", column)
+
+    @classmethod
+    async def apply_relation_exists(cls, models: Union[T, List[T]], relations: Iterable[str]) -> Union[T, List[T]]:
+        return await cls.apply_relation_aggregates(models, relations, "exists")
+
     @classmethod
     async def apply_cached_relations(
-            cls, models: List[T], relations: List[str], cache_time_in_seconds: int
+            cls,
+            models: List[T],
+            relations: List[str],
+            cache_time_in_seconds: int,
+            early_refresh_beta: float = 0,
     ) -> Union[T, List[T]]:
         non_cached_models = []
 
         cache_key_fn = (
             lambda
-            model: f"relations::{cls.table_name()}::{model.__getattribute__(cls.identifier())}::{'__'.join(relations)}"
-        )
-        caches = await (await cls.cache()).mget(
-            [cache_key_fn(model) for model in models]
+            model: cls.relation_cache_version_key(
+                model,
+                f"relations::{cls.table_name()}::{model.__getattribute__(cls.identifier())}::{'__'.join(relations)}",
+            )
         )
-        for index, model in enumerate(models):
-            cached: Optional[Dict] = caches[index]
-            if cached is not None:
-                for key, value in cached.items():
-                    model.set_relation(key, value)
-            else:
-                non_cached_models.append(model)
-
-        await cls.apply_relations(non_cached_models, relations)
-
-        top_level_relations = set([relation.split(".")[0]
-                                  for relation in relations])
-
-        new_caches = {
-            cache_key_fn(model): {
-                relation: model.__getattribute__(relation)
-                for relation in top_level_relations
+        async with CacheFlight(
+            cls.cache, [cache_key_fn(model) for model in models], early_refresh_beta=early_refresh_beta
+        ) as flight:
+            caches = await flight.read()
+            for index, model in enumerate(models):
+                cached: Optional[Dict] = caches[index]
+                if cached is not None:
+                    for key, value in cached.items():
+                        model.set_relation(key, value)
+                else:
+                    non_cached_models.append(model)
+
+            await cls.apply_relations(non_cached_models, relations)
+
+            top_level_relations = set([relation.split(".")[0]
+                                      for relation in relations])
+
+            new_caches = {
+                cache_key_fn(model): {
+                    relation: model.__getattribute__(relation)
+                    for relation in top_level_relations
+                }
+                for model in non_cached_models
             }
-            for model in non_cached_models
-        }
 
-        await (await cls.cache()).mset(new_caches, cache_time_in_seconds)
+            await flight.write(new_caches, cache_time_in_seconds)
 
         return models
 
@@ -240,11 +502,11 @@ class RepositoryAbstract(ABC, Generic[T, V]):
 
         query_str = query if type(query) is str else query.get_sql()
         if return_:
-            return await (await cls.connection()).execute_and_fetch(
+            return await (await cls.current_connection()).execute_and_fetch(
                 query_str, params.values()
             )
         else:
-            return await (await cls.connection()).execute(query_str, params.values())
+            return await (await cls.current_connection()).execute(query_str, params.values())
 
     @classmethod
     async def execute_and_fetch(
@@ -252,6 +514,59 @@ class RepositoryAbstract(ABC, Generic[T, V]):
     ):
         return await cls.execute(query, params, return_=True)
 
+    @classmethod
+    def use_compiled_queries(cls) -> bool:
+        return True
+
+    @classmethod
+    def compiled_query_cache_size(cls) -> int:
+        return 1024
+
+    @classmethod
+    def compiled_queries(cls) -> CompiledQueryCache:
+        if cls not in RepositoryAbstract.__compiled_queries:
+            RepositoryAbstract.__compiled_queries[cls] = CompiledQueryCache(
+                cls.compiled_query_cache_size()
+            )
+        return RepositoryAbstract.__compiled_queries[cls]
+
+    @classmethod
+    def compiled_query(
+            cls, key: Tuple, compiler: Callable[[], Union[QueryBuilder, str]]
+    ) -> str:
+        if not cls.use_compiled_queries():
+            query = compiler()
+            return query if type(query) is str else query.get_sql()
+
+        return cls.compiled_queries().get_or_compile(
+            (cls.schema_name(), cls.table_name(), *key), compiler
+        )
+
+    @classmethod
+    async def column_types(cls) -> Dict[str, str]:
+        key = (cls.schema_name(), cls.table_name())
+        if key not in RepositoryAbstract.__column_types:
+            rows = await cls.execute_and_fetch(
+                "SELECT attname AS name, format_type(atttypid, atttypmod) AS type FROM pg_attribute"
+                " WHERE attrelid = $1::regclass AND attnum > 0 AND NOT attisdropped",
+                Parameters(cls.table().get_sql(quote_char='"')),
+            )
+            RepositoryAbstract.__column_types[key] = {row["name"]: row["type"] for row in rows}
+        return RepositoryAbstract.__column_types[key]
+
+    @classmethod
+    def array_type(cls, column: str) -> Optional[str]:
+        field = cls.model().model_fields.get(column)
+        return None if field is None else Parameters.array_type(field.annotation)
+
+    @classmethod
+    def chunk_size(cls) -> int:
+        return 5000
+
+    @classmethod
+    def chunk_concurrency(cls) -> int:
+        return 1
+
     @classmethod
     def table(cls) -> Table:
         return Table(cls.table_name(), schema=cls.schema_name())
@@ -308,9 +623,7 @@ class RepositoryAbstract(ABC, Generic[T, V]):
                 cls.updated_at_field() is not None
                 and cls.updated_at_field() not in attributes.keys()
         ):
-            attributes[cls.updated_at_field()] = datetime.datetime.now().replace(
-                microsecond=0
-            )
+            attributes[cls.updated_at_field()] = cls.updated_at_value()
 
         params = Parameters(*attributes.values())
         query = cls.insert_query().insert(params.bindings()).columns(*attributes.keys())
@@ -334,6 +647,33 @@ class RepositoryAbstract(ABC, Generic[T, V]):
         if len(attributes) == 0:
             return []
 
+        columns, attributes = cls.insert_many_attributes(attributes)
+        if len(columns) == 0:
+            return []
+        chunks = Parameters.chunks(
+            attributes, min(cls.chunk_size(), Parameters.LIMIT // len(columns))
+        )
+
+        async def insert(chunk: List[Dict]):
+            query = cls.insert_query().columns(*columns)
+
+            params = Parameters()
+            for attribute_group in chunk:
+                group_params = params.make_many(attribute_group.values())
+                query = query.insert(group_params)
+
+            if return_:
+                return await cls.execute_and_fetch(query.get_sql() + " RETURNING *", params)
+            else:
+                return await cls.execute(query, params)
+
+        results = await cls.run_in_chunks(chunks, insert)
+
+        if return_:
+            return await cls.normalize([row for rows in results for row in rows])
+
+    @classmethod
+    def insert_many_attributes(cls, attributes: List[Dict]) -> Tuple[List[str], List[Dict]]:
         for index, attribute_group in enumerate(attributes):
             attributes[index] = cls.apply_mutators(attribute_group)
 
@@ -349,22 +689,155 @@ class RepositoryAbstract(ABC, Generic[T, V]):
         if cls.updated_at_field() is not None and cls.updated_at_field() not in columns:
             columns.append(cls.updated_at_field())
             for attribute_group in attributes:
-                attribute_group[
-                    cls.updated_at_field()
-                ] = datetime.datetime.now().replace(microsecond=0)
+                attribute_group[cls.updated_at_field()] = cls.updated_at_value()
 
-        query = cls.insert_query().columns(*columns)
+        return columns, attributes
 
-        params = Parameters()
-        for attribute_group in attributes:
-            group_params = params.make_many(attribute_group.values())
-            query = query.insert(group_params)
+    @classmethod
+    async def upsert_return(
+            cls, attributes: Dict, conflict_columns: List[str], update_columns: Optional[List[str]] = None
+    ) -> T:
+        return await cls.upsert(attributes, conflict_columns, update_columns, True)
 
+    @classmethod
+    async def upsert(
+            cls,
+            attributes: Dict,
+            conflict_columns: List[str],
+            update_columns: Optional[List[str]] = None,
+            return_: bool = False,
+    ) -> Optional[T]:
+        result = await cls.upsert_many([attributes], conflict_columns, update_columns, return_)
         if return_:
-            rows = await cls.execute_and_fetch(query.get_sql() + " RETURNING *", params)
-            return await cls.normalize(rows)
-        else:
-            return await cls.execute(query, params)
+            return result[0] if len(result) > 0 else None
+
+    @classmethod
+    async def upsert_return_many(
+            cls, attributes: List[Dict], conflict_columns: List[str], update_columns: Optional[List[str]] = None
+    ) -> List[T]:
+        return await cls.upsert_many(attributes, conflict_columns, update_columns, True)
+
+    @classmethod
+    async def upsert_many(
+            cls,
+            attributes: List[Dict],
+            conflict_columns: List[str],
+            update_columns: Optional[List[str]] = None,
+            return_: bool = False,
+    ) -> Optional[List[T]]:
+        if len(attributes) == 0:
+            return []
+
+        columns, attributes = cls.insert_many_attributes(attributes)
+        if len(columns) == 0:
+            return []
+
+        # Postgres rejects a batch that touches the same conflicting row twice, the last one wins.
+        unique_attributes = {}
+        for index, attribute_group in enumerate(attributes):
+            key = tuple(attribute_group.get(column) for column in conflict_columns)
+            unique_attributes[index if None in key else key] = attribute_group
+        attributes = list(unique_attributes.values())
+
+        if update_columns is None:
+            update_columns = [
+                column for column in columns
+                if column not in conflict_columns and column != cls.created_at_field()
+            ]
+        # An empty list means insert-or-ignore, conflicting rows are left untouched.
+        if (
+                len(update_columns) > 0
+                and cls.updated_at_field() in columns
+                and cls.updated_at_field() not in update_columns
+        ):
+            update_columns = [*update_columns, cls.updated_at_field()]
+
+        chunks = Parameters.chunks(
+            attributes, min(cls.chunk_size(), Parameters.LIMIT // len(columns))
+        )
+
+        async def upsert(chunk: List[Dict]):
+            query = PostgreSQLQuery.into(cls.table()).columns(*columns)
+
+            params = Parameters()
+            for attribute_group in chunk:
+                query = query.insert(params.make_many(attribute_group.get(column) for column in columns))
+
+            query = query.on_conflict(*conflict_columns)
+            if len(update_columns) == 0:
+                query = query.do_nothing()
+            for column in update_columns:
+                query = query.do_update(column)
+
+            if return_:
+                rows = await cls.execute_and_fetch(query.get_sql() + " RETURNING *", params)
+            elif cls.entity_cache_enabled() or cls.identity_map_active():
+                rows = await cls.execute_and_fetch(query.get_sql() + f' RETURNING "{cls.identifier()}"', params)
+            else:
+                return await cls.execute(query, params)
+
+            identifiers = [row[cls.identifier()] for row in rows]
+            await cls.forget_cached_entities(identifiers)
+            cls.forget_remembered(identifiers)
+            return rows
+
+        results = await cls.run_in_chunks(chunks, upsert)
+
+        if return_:
+            return await cls.normalize([row for rows in results for row in rows])
+
+    @classmethod
+    async def copy_return_many(cls, attributes: List[Dict]) -> List[T]:
+        return await cls.copy_many(attributes, True)
+
+    @classmethod
+    async def copy_many(
+            cls, attributes: List[Dict], return_: bool = False
+    ) -> Optional[List[T]]:
+        if len(attributes) == 0:
+            return []
+
+        columns, attributes = cls.insert_many_attributes(attributes)
+        if len(columns) == 0:
+            return []
+        records = [
+            tuple(attribute_group.get(column) for column in columns)
+            for attribute_group in attributes
+        ]
+        connection = await cls.current_connection()
+
+        if not return_:
+            await connection.copy_records(cls.table_name(), columns, records, cls.schema_name())
+            return None
+
+        # COPY can't return rows, so stage them in a temporary table and move them with INSERT ... RETURNING.
+        staging = Table(f"x_copy_{cls.table_name()}_{uuid.uuid4().hex[:8]}")
+        staging_name = staging.get_sql(quote_char='"')
+        async with connection.transaction():
+            await connection.execute(
+                f"CREATE TEMPORARY TABLE {staging_name}"
+                + (" ON COMMIT DROP" if connection.transactions_enabled else "")
+                + f" AS {Query.from_(cls.table()).select(*columns).get_sql()} WITH NO DATA"
+            )
+            try:
+                await connection.copy_records(staging.get_table_name(), columns, records)
+                rows = await connection.execute_and_fetch(
+                    Query.into(cls.table()).columns(*columns).from_(staging).select(*columns).get_sql()
+                    + " RETURNING *"
+                )
+            finally:
+                if not connection.transactions_enabled:
+                    await connection.execute(f"DROP TABLE IF EXISTS {staging_name}")
+
+        return await cls.normalize(rows)
+
+    @classmethod
+    async def run_in_chunks(cls, chunks: List[List], callback: Callable[[List], Awaitable]) -> List:
+        if len(chunks) == 1:
+            return [await callback(chunks[0])]
+
+        async with (await cls.current_connection()).transaction():
+            return [await callback(chunk) for chunk in chunks]
 
     @classmethod
     async def update_return(cls, query: QueryBuilder, attributes: Dict) -> Union[T, List[T]]:
@@ -375,13 +848,22 @@ class RepositoryAbstract(ABC, Generic[T, V]):
         if len(identifiers) == 0:
             return
 
-        params = Parameters(*identifiers)
-        return await cls.update(
-            cls.update_query().where(cls.field(field).isin(params.bindings())),
-            attributes,
-            params=params,
+        attributes = cls.update_attributes(attributes)
+        chunks = Parameters.chunks(
+            identifiers, min(cls.chunk_size(), Parameters.LIMIT - len(attributes))
         )
 
+        async def update(chunk: List):
+            values, condition = Parameters.membership(cls.field(field), chunk, cls.array_type(field))
+            params = Parameters(*values)
+            return await cls.apply_update(
+                cls.update_query().where(condition(params.bindings())),
+                attributes,
+                params=params,
+            )
+
+        await cls.run_in_chunks(chunks, update)
+
     @classmethod
     async def update_where_identifier_in(cls, identifiers: List, attributes: Dict):
         return await cls.update_where_in(cls.identifier(), identifiers, attributes)
@@ -394,34 +876,127 @@ class RepositoryAbstract(ABC, Generic[T, V]):
             return_: bool = False,
             params: Optional[Parameters] = None,
     ) -> Optional[Union[T, List[T]]]:
-        cls.apply_mutators(attributes)
+        return await cls.apply_update(query, cls.update_attributes(attributes), return_, params)
+
+    @classmethod
+    async def apply_update(
+            cls,
+            query: QueryBuilder,
+            attributes: Dict,
+            return_: bool = False,
+            params: Optional[Parameters] = None,
+    ) -> Optional[Union[T, List[T]]]:
         params = params if params is not None else Parameters()
+        cls.forget_remembered()
 
         for key, value in attributes.items():
             query = query.set(key, params.make(value))
 
+        if return_:
+            rows = await cls.execute_and_fetch(query.get_sql() + " RETURNING *", params)
+            await cls.forget_cached_entities([row[cls.identifier()] for row in rows])
+            return await cls.normalize(rows)
+        elif cls.entity_cache_enabled():
+            rows = await cls.execute_and_fetch(query.get_sql() + f' RETURNING "{cls.identifier()}"', params)
+            await cls.forget_cached_entities([row[cls.identifier()] for row in rows])
+        else:
+            return await cls.execute(query, params)
+
+    @classmethod
+    def update_attributes(cls, attributes: Dict) -> Dict:
+        attributes = dict(cls.apply_mutators(attributes))
+
         if (
                 cls.updated_at_field() is not None
                 and cls.updated_at_field() not in attributes.keys()
         ):
-            query = query.set(
-                cls.updated_at_field(),
-                params.make(datetime.datetime.now().replace(microsecond=0)),
-            )
+            attributes[cls.updated_at_field()] = cls.updated_at_value()
 
-        if return_:
-            return await cls.normalize(
-                await cls.execute_and_fetch(query.get_sql() + " RETURNING *", params)
-            )
-        else:
-            return await cls.execute(query, params)
+        return attributes
 
     @classmethod
-    async def normalize(cls, rows: List[Dict]) -> List[T]:
-        return await cls.apply_default_relations(
-            cls.cast_to_models(cls.apply_accessors(rows))
+    def compiled_update_query(
+            cls,
+            key: Tuple,
+            params: Parameters,
+            condition: Callable,
+            columns: List[str],
+            return_: bool = False,
+    ) -> str:
+        condition_count = len(params.values()) - len(columns)
+
+        def compiler():
+            bindings = params.bindings()
+            query = cls.update_query().where(condition(bindings[:condition_count]))
+            for column, binding in zip(columns, bindings[condition_count:]):
+                query = query.set(column, binding)
+            return query.get_sql() + (" RETURNING *" if return_ else "")
+
+        return cls.compiled_query(
+            (*key, condition_count, tuple(columns), return_), compiler
         )
 
+    @classmethod
+    async def normalize(cls, rows: List[Dict]) -> List[T]:
+        rows, joined = cls.split_joined_rows(rows)
+        models = cls.cast_to_models(cls.apply_accessors(rows))
+
+        for relation_name, related_rows in joined.items():
+            await cls.attach_joined(models, relation_name, related_rows)
+
+        return await cls.apply_default_relations(models)
+
+    @classmethod
+    async def joined_query(cls, relations: List[str], with_thrashed: bool = False) -> V:
+        query = cls.select_query(with_thrashed).select(cls.table().star)
+        for relation_name in relations:
+            relation: Relation = getattr(cls, relation_name + "_relation")()
+            if not relation.joinable:
+                raise RelationNotJoinableException(relation_name)
+            query = await relation.join(relation_name, query)
+        return query
+
+    @classmethod
+    def split_joined_rows(cls, rows: List[Dict]) -> Tuple[List[Dict], Dict[str, List[Optional[Dict]]]]:
+        prefix = "x_join__"
+        if len(rows) == 0 or not any(key.startswith(prefix) for key in rows[0].keys()):
+            return rows, {}
+
+        parents = []
+        joined: Dict[str, List[Optional[Dict]]] = {}
+        for row in rows:
+            parent, related = {}, {}
+            for key, value in row.items():
+                if key.startswith(prefix):
+                    relation_name, _, column = key[len(prefix):].partition("__")
+                    related.setdefault(relation_name, {})[column] = value
+                else:
+                    parent[key] = value
+
+            parents.append(parent)
+            for relation_name, values in related.items():
+                # A LEFT JOIN without a match fills every related column with NULL.
+                missing = all(value is None for value in values.values())
+                joined.setdefault(relation_name, []).append(None if missing else values)
+
+        return parents, joined
+
+    @classmethod
+    async def attach_joined(cls, models: List[T], relation_name: str, rows: List[Optional[Dict]]) -> None:
+        relation_repo = getattr(cls, relation_name + "_relation")().relation_repo
+
+        unique_rows = {}
+        for row in rows:
+            if row is not None:
+                unique_rows.setdefault(str(row.get(relation_repo.identifier())), row)
+        related = dict(zip(unique_rows.keys(), await relation_repo.normalize(list(unique_rows.values()))))
+
+        for model, row in zip(models, rows):
+            model.forget_relation(relation_name)
+            if row is not None:
+                model.set_relation(relation_name, related[str(row.get(relation_repo.identifier()))])
+            model.x_applied_relations.add(relation_name)
+
     @classmethod
     async def update_return_by_id(cls, identifier: any, attributes: Dict) -> T:
         return await cls.update_by_id(identifier, attributes, True)
@@ -436,17 +1011,25 @@ class RepositoryAbstract(ABC, Generic[T, V]):
             else:
                 return None
 
-        params = Parameters()
-        result = await cls.update(
-            cls.update_query().where(
-                Field(cls.identifier()).eq(params.make(identifier))
-            ),
-            attributes,
+        attributes = cls.update_attributes(attributes)
+        params = Parameters(identifier, *attributes.values())
+        query = cls.compiled_update_query(
+            ("update_by_id",),
+            params,
+            lambda bindings: Field(cls.identifier()).eq(bindings[0]),
+            list(attributes.keys()),
             return_,
-            params=params,
         )
+
         if return_:
-            return result[0]
+            rows = await cls.execute_and_fetch(query, params)
+            await cls.forget_cached_entities(identifier)
+            return (await cls.normalize(rows))[0]
+        else:
+            cls.forget_remembered(identifier)
+            result = await cls.execute(query, params)
+            await cls.forget_cached_entities(identifier)
+            return result
 
     @classmethod
     async def update_model(cls, model: T, columns: List[str]):
@@ -462,37 +1045,167 @@ class RepositoryAbstract(ABC, Generic[T, V]):
         await cls.update_by_id(model.__getattribute__(cls.identifier()), attributes)
         return model
 
+    @classmethod
+    def identifier_condition(cls, identifier: any) -> Tuple[List, Callable]:
+        if isinstance(identifier, List):
+            return Parameters.membership(
+                cls.field(cls.identifier()), identifier, cls.array_type(cls.identifier())
+            )
+        else:
+            return [identifier], lambda bindings: cls.field(cls.identifier()).eq(bindings[0])
+
+    @classmethod
+    async def update_many(cls, models: List[Union[T, Dict]], columns: Optional[List[str]] = None):
+        groups: Dict[Tuple[str, ...], List[Tuple[Any, Dict]]] = {}
+        changed_models: List[Tuple[T, Dict]] = []
+
+        for model in models:
+            if isinstance(model, dict):
+                identifier = model[cls.identifier()]
+                changes = {
+                    key: value for key, value in model.items()
+                    if key != cls.identifier() and (columns is None or key in columns)
+                }
+            else:
+                identifier = model.__getattribute__(cls.identifier())
+                changes = {
+                    column: model.__getattribute__(column)
+                    for column in (UnitOfWork.dirty_columns(model) if columns is None else columns)
+                    if hasattr(model, column)
+                    and model.__getattribute__(column) != model.x_original.get(column)
+                }
+                if len(changes) > 0:
+                    changed_models.append((model, dict(changes)))
+
+            if len(changes) == 0:
+                continue
+
+            attributes = cls.update_attributes(changes)
+            groups.setdefault(tuple(attributes.keys()), []).append((identifier, attributes))
+            cls.forget_remembered(identifier)
+
+        if len(groups) == 0:
+            return
+
+        column_types = await cls.column_types()
+
+        def unnestable(group_columns: Tuple[str, ...]) -> bool:
+            # unnest flattens nested arrays, rows setting an array column go one at a time.
+            return all(
+                column in column_types and not column_types[column].endswith("]")
+                for column in (cls.identifier(), *group_columns)
+            )
+
+        statements = [
+            (group_columns, chunk)
+            for group_columns, rows in groups.items()
+            for chunk in Parameters.chunks(rows, cls.chunk_size() if unnestable(group_columns) else 1)
+        ]
+
+        async def update(statement: Tuple[Tuple[str, ...], List[Tuple[Any, Dict]]]):
+            group_columns, rows = statement
+            params = Parameters()
+            if unnestable(group_columns):
+                params.make([identifier for identifier, _ in rows])
+                for column in group_columns:
+                    params.make([attributes[column] for _, attributes in rows])
+            else:
+                for identifier, attributes in rows:
+                    params.make(identifier)
+                    params.make_many(attributes[column] for column in group_columns)
+
+            # Each column is bound as a single array, the statement text doesn't grow with the rows.
+            query = cls.compiled_query(
+                ("update_many", group_columns),
+                lambda: cls.update_many_query(group_columns, column_types, unnestable(group_columns)),
+            )
+            return await cls.execute(query, params)
+
+        await cls.run_in_chunks(statements, update)
+        await cls.forget_cached_entities(
+            [identifier for rows in groups.values() for identifier, _ in rows]
+        )
+
+        for model, changes in changed_models:
+            for column, value in changes.items():
+                model.x_original[column] = value
+
+    @classmethod
+    def update_many_query(cls, columns: Tuple[str, ...], column_types: Dict[str, str], unnest: bool = True) -> str:
+        table = cls.table().get_sql(quote_char='"')
+        value_columns = [cls.identifier(), *columns]
+        if unnest:
+            values = "unnest(" + ",".join(
+                f"${index + 1}::{column_types[column]}[]" for index, column in enumerate(value_columns)
+            ) + ")"
+        else:
+            values = "(VALUES (" + ",".join(
+                f"${index + 1}" + (f"::{column_types[column]}" if column in column_types else "")
+                for index, column in enumerate(value_columns)
+            ) + "))"
+        assignments = ",".join(f'"{column}"="x_values"."{column}"' for column in columns)
+        names = ",".join(f'"{column}"' for column in value_columns)
+        return (
+            f'UPDATE {table} SET {assignments} FROM {values} AS "x_values"({names})'
+            f' WHERE {table}."{cls.identifier()}"="x_values"."{cls.identifier()}"'
+        )
+
     @classmethod
     async def soft_delete_by_id(cls, identifier: any):
+        cls.forget_remembered(identifier)
         if isinstance(identifier, List) and len(identifier) == 0:
             return
-        elif isinstance(identifier, List):
-            params = Parameters(*identifier)
-            condition = cls.field(cls.identifier()).isin(params.bindings())
-        else:
-            params = Parameters()
-            condition = cls.field(cls.identifier()).eq(params.make(identifier))
 
-        return await cls.update(
-            cls.update_query().where(condition),
-            dict(deleted_at=datetime.datetime.now().replace(microsecond=0)),
-            params=params,
+        attributes = cls.update_attributes(
+            {cls.soft_delete_identifier(): datetime.datetime.now().replace(microsecond=0)}
         )
 
+        async def soft_delete(identifiers: Any):
+            values, condition = cls.identifier_condition(identifiers)
+            params = Parameters(*values, *attributes.values())
+            query = cls.compiled_update_query(
+                ("soft_delete_by_id", isinstance(identifiers, List)),
+                params,
+                condition,
+                list(attributes.keys()),
+            )
+            return await cls.execute(query, params)
+
+        if not isinstance(identifier, List):
+            result = await soft_delete(identifier)
+        else:
+            chunks = Parameters.chunks(
+                identifier, min(cls.chunk_size(), Parameters.LIMIT - len(attributes))
+            )
+            result = None
+            await cls.run_in_chunks(chunks, soft_delete)
+
+        await cls.forget_cached_entities(identifier)
+        return result
+
     @classmethod
     async def hard_delete_by_id(cls, identifier: any):
+        cls.forget_remembered(identifier)
         if isinstance(identifier, List) and len(identifier) == 0:
             return
-        if isinstance(identifier, List):
-            params = Parameters(*identifier)
-            condition = cls.field(cls.identifier()).isin(params.bindings())
-        else:
-            params = Parameters()
-            condition = cls.field(cls.identifier()).eq(params.make(identifier))
 
-        query = cls.select_query().delete().where(condition)
+        async def hard_delete(identifiers: Any):
+            values, condition = cls.identifier_condition(identifiers)
+            params = Parameters(*values)
+            query = cls.compiled_query(
+                ("hard_delete_by_id", isinstance(identifiers, List), len(params.values())),
+                lambda: cls.select_query().delete().where(condition(params.bindings())),
+            )
+            return await cls.execute(query, params=params)
+
+        if not isinstance(identifier, List):
+            result = await hard_delete(identifier)
+        else:
+            result = None
+            await cls.run_in_chunks(Parameters.chunks(identifier, cls.chunk_size()), hard_delete)
 
-        return await cls.execute(query, params=params)
+        await cls.forget_cached_entities(identifier)
+        return result
 
     @classmethod
     async def delete_by_id(cls, identifier: Union[Any, List[Any]]):
@@ -528,6 +1241,45 @@ class RepositoryAbstract(ABC, Generic[T, V]):
 
         return results
 
+    @classmethod
+    async def stream_chunks(
+            cls,
+            query: Union[QueryBuilder, str],
+            params: Optional[Parameters] = None,
+            chunk_size: int = 1000,
+            relations: Optional[List] = None,
+    ) -> AsyncIterator[List[T]]:
+        if params is None:
+            params = Parameters()
+
+        # The cursor's transaction closes when this generator does, consumers leaving early
+        # should close it explicitly (aclose() or contextlib.aclosing) instead of relying on gc.
+        query_str = query if type(query) is str else query.get_sql()
+        async with (await cls.current_connection()).cursor(query_str, params.values(), chunk_size) as chunks:
+            async for rows in chunks:
+                models = await cls.normalize(rows)
+
+                if relations is not None:
+                    await cls.apply_relations(models, relations)
+
+                yield models
+
+    @classmethod
+    async def stream(
+            cls,
+            query: Union[QueryBuilder, str],
+            params: Optional[Parameters] = None,
+            chunk_size: int = 1000,
+            relations: Optional[List] = None,
+    ) -> AsyncIterator[T]:
+        chunks = cls.stream_chunks(query, params, chunk_size, relations)
+        try:
+            async for models in chunks:
+                for model in models:
+                    yield model
+        finally:
+            await chunks.aclose()
+
     @classmethod
     async def all(cls) -> List[T]:
         return await cls.get(cls.select_query().select("*"))
@@ -554,15 +1306,110 @@ class RepositoryAbstract(ABC, Generic[T, V]):
         if identifier is None:
             return None
 
-        params = Parameters()
-        return await cls.first(
-            cls.select_query(with_thrashed=with_thrashed)
-            .where(Field(cls.identifier()).eq(params.make(identifier)))
-            .select("*"),
-            params=params,
-            relations=relations,
+        remembered, _ = cls.remembered_models([identifier], with_thrashed)
+        if len(remembered) > 0:
+            if relations is not None:
+                await cls.apply_relations(remembered, relations)
+            return remembered[0]
+
+        if await cls.entity_cache_usable():
+            result = await cls.find_by_ids([identifier], relations, with_thrashed)
+            return None if len(result) == 0 else result[0]
+
+        result = await cls.get(
+            cls.find_by_id_query(with_thrashed), params=Parameters(identifier), relations=relations
+        )
+        return None if len(result) == 0 else result[0]
+
+    @classmethod
+    async def find_by_ids(
+        cls,
+        identifiers: List,
+        relations: Optional[List] = None,
+        with_thrashed: bool = False
+    ) -> List[T]:
+        identifiers = list({str(identifier): identifier for identifier in identifiers if identifier is not None}.values())
+        models, identifiers = cls.remembered_models(identifiers, with_thrashed)
+
+        rows = []
+        cache_usable = await cls.entity_cache_usable()
+        if cache_usable and len(identifiers) > 0:
+            rows, identifiers = await cls.cached_rows(identifiers)
+
+        fetched = []
+        for chunk in Parameters.chunks(identifiers, cls.chunk_size()):
+            values, condition = cls.identifier_condition(chunk)
+            params = Parameters(*values)
+            query = cls.compiled_query(
+                ("find_by_ids", with_thrashed, len(values)),
+                lambda: cls.select_query(with_thrashed=with_thrashed)
+                .where(condition(params.bindings()))
+                .select("*"),
+            )
+            fetched += await cls.execute_and_fetch(query, params)
+
+        if cache_usable and len(fetched) > 0:
+            await cls.cache_rows(fetched)
+
+        models += await cls.normalize(rows + fetched)
+
+        if relations is not None:
+            await cls.apply_relations(models, relations)
+
+        return models
+
+    @classmethod
+    def loader(cls, relations: Optional[List] = None, with_thrashed: bool = False) -> DataLoader:
+        relations = tuple(relations) if relations is not None else None
+        return DataLoader.batch(
+            (cls, with_thrashed, relations),
+            lambda identifiers: cls.find_by_ids(
+                identifiers, list(relations) if relations is not None else None, with_thrashed
+            ),
+            lambda model: model.__getattribute__(cls.identifier()),
         )
 
+    @classmethod
+    async def load(
+        cls,
+        identifier: any,
+        relations: Optional[List] = None,
+        with_thrashed: bool = False
+    ) -> Union[T, None]:
+        if identifier is None:
+            return None
+
+        return await cls.loader(relations, with_thrashed).load(identifier)
+
+    @classmethod
+    async def load_many(
+        cls,
+        identifiers: List,
+        relations: Optional[List] = None,
+        with_thrashed: bool = False
+    ) -> List[Union[T, None]]:
+        loader = cls.loader(relations, with_thrashed)
+        return list(await asyncio.gather(*[
+            loader.load(identifier) if identifier is not None else cls.load(None)
+            for identifier in identifiers
+        ]))
+
+    @classmethod
+    def find_by_id_query(cls, with_thrashed: bool = False) -> str:
+        return cls.compiled_query(
+            ("find_by_id", with_thrashed),
+            lambda: cls.select_query(with_thrashed=with_thrashed)
+            .where(Field(cls.identifier()).eq(Parameter("$1")))
+            .select("*")
+            .limit(1),
+        )
+
+    @classmethod
+    def warm_up_queries(cls) -> List[str]:
+        if cls.soft_deletes():
+            return [cls.find_by_id_query(), cls.find_by_id_query(with_thrashed=True)]
+        return [cls.find_by_id_query()]
+
     @classmethod
     async def fresh(cls, model: T, relations: Optional[List] = None) -> T:
         return await cls.find_by_id(
@@ -721,7 +1568,7 @@ class RepositoryAbstract(ABC, Generic[T, V]):
     async def touch(cls, identifier: Any) -> None:
         await cls.update_by_id(
             identifier,
-            {cls.updated_at_field(): datetime.datetime.now().replace(microsecond=0)},
+            {cls.updated_at_field(): cls.updated_at_value()},
         )
 
     @classmethod
@@ -0,0 +1,17 @@
+from basalam.backbone_redis_cache import RedisCache
+
+
+class RepositoryCache(RedisCache):
+    # Deletes the lock only while it still holds the caller's token, in one round trip.
+    UNLOCK_SCRIPT = (
+        "if redis.call('get', KEYS[1]) == ARGV[1] then return redis.call('del', KEYS[1]) else return 0 end"
+    )
+
+    async def lock(self, key: str, token: str, seconds: float) -> bool:
+        return bool(await self._connection.set(self._prefix + key, token, nx=True, px=int(seconds * 1000)))
+
+    async def unlock(self, key: str, token: str) -> bool:
+        return bool(await self._connection.eval(self.UNLOCK_SCRIPT, 1, self._prefix + key, token))
+
+    async def locked(self, key: str) -> bool:
+        return bool(await self._connection.exists(self._prefix + key))
@@ -0,0 +1,90 @@
+from contextlib import AsyncExitStack
+from contextvars import ContextVar, Token
+from typing import Dict, List, Optional, Tuple, Type, TYPE_CHECKING
+
+from .model_abstract import ModelAbstract
+
+if TYPE_CHECKING:
+    from basalam.backbone_orm.repository_abstract import RepositoryAbstract
+
+
+class UnitOfWork:
+    __current: ContextVar[Optional["UnitOfWork"]] = ContextVar("backbone_orm_unit_of_work", default=None)
+
+    def __init__(self) -> None:
+        self.__new: Dict[Type["RepositoryAbstract"], Dict[Tuple[str, ...], List[Dict]]] = {}
+        self.__tracked: Dict[Type["RepositoryAbstract"], Dict[int, ModelAbstract]] = {}
+        self.__deleted: Dict[Type["RepositoryAbstract"], Dict[int, ModelAbstract]] = {}
+        self.__token: Optional[Token] = None
+
+    @classmethod
+    def current(cls) -> Optional["UnitOfWork"]:
+        return cls.__current.get()
+
+    async def __aenter__(self) -> "UnitOfWork":
+        self.__token = UnitOfWork.__current.set(self)
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, exc_tb) -> bool:
+        UnitOfWork.__current.reset(self.__token)
+        self.__token = None
+        if exc_type is None:
+            await self.flush()
+        return False
+
+    def add(self, repository: Type["RepositoryAbstract"], attributes: Dict) -> None:
+        self.__new.setdefault(repository, {}).setdefault(tuple(attributes.keys()), []).append(attributes)
+
+    def track(self, repository: Type["RepositoryAbstract"], models: List[ModelAbstract]) -> None:
+        tracked = self.__tracked.setdefault(repository, {})
+        for model in models:
+            tracked[id(model)] = model
+
+    def delete(self, repository: Type["RepositoryAbstract"], model: ModelAbstract) -> None:
+        self.__deleted.setdefault(repository, {})[id(model)] = model
+        self.__tracked.get(repository, {}).pop(id(model), None)
+
+    @staticmethod
+    def dirty_columns(model: ModelAbstract) -> List[str]:
+        return [
+            column
+            for column, value in model.x_original.items()
+            if column in type(model).model_fields and column[0:2] != "x_" and model.__getattribute__(column) != value
+        ]
+
+    def dirty(self) -> Dict[Type["RepositoryAbstract"], List[ModelAbstract]]:
+        dirty = {}
+        for repository, models in self.__tracked.items():
+            models = [model for model in models.values() if len(self.dirty_columns(model)) > 0]
+            if len(models) > 0:
+                dirty[repository] = models
+        return dirty
+
+    async def flush(self) -> None:
+        new, dirty, deleted = self.__new, self.dirty(), self.__deleted
+        self.__new, self.__deleted = {}, {}
+
+        repositories = {*new.keys(), *dirty.keys(), *deleted.keys()}
+        if len(repositories) == 0:
+            return
+
+        connections = []
+        for repository in repositories:
+            connection = await repository.current_connection()
+            if connection not in connections:
+                connections.append(connection)
+
+        async with AsyncExitStack() as stack:
+            for connection in connections:
+                await stack.enter_async_context(connection.transaction())
+
+            for repository, groups in new.items():
+                for attributes in groups.values():
+                    await repository.create_many(attributes)
+
+            for repository, models in dirty.items():
+                columns = list({column: None for model in models for column in self.dirty_columns(model)})
+                await repository.update_many(models, columns)
+
+            for repository, models in deleted.items():
+                await repository.delete_models(list(models.values()))
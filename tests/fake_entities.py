@@ -144,6 +144,10 @@ class FakePost(ModelAbstract):
     def author(self) -> Optional["FakeAuthor"]:
         return self.relation("author")
 
+    @property
+    def writer(self) -> Optional["FakeAuthor"]:
+        return self.relation("writer")
+
     @property
     def tags(self) -> List["FakeTag"]:
         return self.relation("tags")
@@ -187,6 +191,10 @@ class FakePostRepo(RepositoryAbstract[FakePost, BaseQueryBuilder]):
     def author_relation(cls):
         return cls.belongs_to(FakeAuthorRepo, "author_id", "id")
 
+    @classmethod
+    def writer_relation(cls):
+        return cls.belongs_to(FakeAuthorRepo, "author_id", "id")
+
     @classmethod
     def tags_relation(cls):
         return cls.belongs_to_many(
@@ -1,8 +1,18 @@
+import asyncio
+from typing import Optional
+
 import pytest
+from pypika import Field
 
+from basalam.backbone_orm import Parameters, PreparedStatementCache, CursorPaginationResponse, PaginationResponse, IdentityMap, UnitOfWork, LayeredCache, LocalCache, CacheCodec, CacheFlight, Hydrator, RelationNotJoinableException
+from basalam.backbone_orm.relation import RelationIndex
+from basalam.backbone_orm.relation_tree import RelationTree
+from basalam.backbone_orm.postgres_manager import ConnectionConfig, DriverEnum, PostgresManager
 from .connections import postgres
 from .fake_entities import (
     MigrateFakeEntities,
+    FakeAuthor,
+    FakePost,
     FakeAuthorRepo,
     FakePostRepo,
     FakeTagRepo,
@@ -12,6 +22,32 @@ from .fake_entities import (
 )
 
 
+class FakePostCursorPagination(CursorPaginationResponse):
+    @classmethod
+    def repo(cls):
+        return FakePostRepo
+
+    @classmethod
+    def mapper(cls):
+        async def mapper(post):
+            return post.title
+
+        return mapper
+
+
+class FakePostPagination(PaginationResponse):
+    @classmethod
+    def repo(cls):
+        return FakePostRepo
+
+    @classmethod
+    def mapper(cls):
+        async def mapper(post):
+            return post.title
+
+        return mapper
+
+
 class TestDatabase:
     @pytest.fixture(scope="function", autouse=True)
     async def seed_fake_entities(self):
@@ -203,6 +239,514 @@ class TestDatabase:
         assert author.name == "Andy"
         assert author.x_original["name"] == "Andy"
 
+    async def test_compiled_queries_are_reused(self):
+        author = await FakeAuthorRepo.create_return({"name": "Fake Name"})
+        FakeAuthorRepo.compiled_queries().clear()
+
+        await FakeAuthorRepo.find_by_id(author.id)
+        await FakeAuthorRepo.update_by_id(author.id, {"name": "Andy"})
+        assert len(FakeAuthorRepo.compiled_queries()) == 2
+
+        await FakeAuthorRepo.update_by_id(author.id, {"name": "Sandy"})
+        author = await FakeAuthorRepo.find_by_id(author.id)
+
+        assert len(FakeAuthorRepo.compiled_queries()) == 2
+        assert author.name == "Sandy jr."
+
+    async def test_prepared_statements_are_reused(self):
+        connection = await postgres.acquire()
+        connection.enable_prepared_statements(PreparedStatementCache(max_size=10))
+        author = await FakeAuthorRepo.create_return({"name": "Fake Name"})
+
+        await FakeAuthorRepo.find_by_id(author.id)
+        author = await FakeAuthorRepo.find_by_id(author.id)
+        prepared_statements = connection.prepared_statements
+        connection.disable_prepared_statements()
+
+        assert author.name == "Fake Name jr."
+        assert prepared_statements.hits == 1
+        assert prepared_statements.hot(1) == [(FakeAuthorRepo.find_by_id_query(), 1)]
+
+    async def test_stream(self):
+        author = await FakeAuthorRepo.create_return({"name": "Fake Name"})
+        await FakePostRepo.create_many(
+            [{"author_id": author.id, "title": f"Post {index}"} for index in range(5)]
+        )
+
+        posts = [
+            post
+            async for post in FakePostRepo.stream(
+                FakePostRepo.select_query().select("*").orderby("id"),
+                chunk_size=2,
+                relations=["author"],
+            )
+        ]
+
+        assert [post.title for post in posts] == [f"Post {index}" for index in range(5)]
+        assert all(post.author.id == author.id for post in posts)
+        assert (await postgres.acquire()).is_in_transaction is False
+
+        stream = FakePostRepo.stream(FakePostRepo.select_query().select("*"), chunk_size=2)
+        async for _ in stream:
+            break
+        await stream.aclose()
+        assert (await postgres.acquire()).is_in_transaction is False
+
+    async def test_cursor_pagination(self):
+        await FakePostRepo.create_many(
+            [{"author_id": 1, "title": f"Post {index}"} for index in range(5)]
+        )
+        query = FakePostRepo.select_query().select("*")
+
+        first = await FakePostCursorPagination.make(query, per_page=2)
+        second = await FakePostCursorPagination.make(query, per_page=2, cursor=first.next_cursor)
+        third = await FakePostCursorPagination.make(query, per_page=2, cursor=second.next_cursor)
+        previous = await FakePostCursorPagination.make(query, per_page=2, cursor=third.prev_cursor)
+
+        assert first.data == ["Post 0", "Post 1"] and first.prev_cursor is None
+        assert second.data == ["Post 2", "Post 3"] and second.has_more is True
+        assert third.data == ["Post 4"] and third.has_more is False
+        assert previous.data == second.data
+
+    async def test_pagination(self):
+        await FakePostRepo.create_many(
+            [{"author_id": 1, "title": f"Post {index}"} for index in range(5)]
+        )
+        query = FakePostRepo.select_query().select("*").orderby("id")
+
+        counted = await FakePostPagination.make(query, page=2, per_page=2)
+        uncounted = await FakePostPagination.make(query, page=3, per_page=2, with_count=False)
+
+        assert counted.data == ["Post 2", "Post 3"]
+        assert counted.total == 5 and "has_more" not in counted.model_dump(by_alias=True)
+        assert uncounted.model_dump(by_alias=True)["has_more"] is False
+        assert uncounted.data == ["Post 4"]
+        assert uncounted.total is None and uncounted.has_more is False
+
+    async def test_copy_many(self):
+        await FakeAuthorRepo.copy_many([{"name": "A", "metadata": {"a": 1}}, {"name": "B", "metadata": None}])
+        authors = await FakeAuthorRepo.copy_return_many([{"name": "C", "metadata": {"c": 3}}])
+
+        assert authors[0].name == "C jr."
+        assert authors[0].metadata == {"c": 3}
+        assert len(await FakeAuthorRepo.all()) == 3
+
+    async def test_chunked_writes_and_relations(self, monkeypatch):
+        monkeypatch.setattr(FakePostRepo, "chunk_size", classmethod(lambda cls: 2))
+        monkeypatch.setattr(FakeAuthorRepo, "chunk_size", classmethod(lambda cls: 2))
+        authors = await FakeAuthorRepo.create_return_many([{"name": name} for name in "ABCDE"])
+        await FakePostRepo.create_many(
+            [{"author_id": author.id, "title": author.name} for author in authors]
+        )
+
+        await FakeAuthorRepo.apply_relation(authors, "posts")
+        await FakePostRepo.update_where_in("author_id", [author.id for author in authors], {"is_active": 0})
+        await FakeAuthorRepo.delete_models(authors)
+
+        assert [len(author.posts) for author in authors] == [1] * 5
+        assert await FakePostRepo.count(FakePostRepo.select_where(Field("is_active") == 0)) == 5
+        assert len(await FakeAuthorRepo.all()) == 0
+        assert await FakeAuthorRepo.create_return_many([{}]) == []
+        assert await FakeAuthorRepo.upsert_many([{}], ["id"]) == []
+
+    async def test_array_membership_filters(self):
+        authors = await FakeAuthorRepo.create_return_many([{"name": name} for name in "ABC"])
+        await FakePostRepo.create_many([{"author_id": author.id, "title": author.name} for author in authors])
+        FakePostRepo.compiled_queries().clear()
+
+        await FakeAuthorRepo.apply_relation(authors[:1], "posts")
+        await FakeAuthorRepo.apply_relation(authors, "posts")
+        await FakeAuthorRepo.delete_by_id([str(author.id) for author in authors[1:]])
+
+        assert len(FakePostRepo.compiled_queries()) == 1
+        assert Parameters.array_type(Optional[int]) == Parameters.array_type(int | None) == "bigint"
+        assert [len(author.posts) for author in authors] == [1] * 3
+        assert [author.id for author in await FakeAuthorRepo.all()] == [authors[0].id]
+
+    async def test_identity_map(self):
+        author = await FakeAuthorRepo.create_return({"name": "A"})
+        posts = await FakePostRepo.create_return_many(
+            [{"author_id": author.id, "title": title} for title in "AB"]
+        )
+
+        with IdentityMap.scope():
+            found = await FakeAuthorRepo.find_by_id(author.id)
+            await FakePostRepo.apply_relation(posts, "author")
+            assert all(post.author is found for post in posts)
+            assert await FakeAuthorRepo.find_by_id(author.id) is found
+
+            await FakeAuthorRepo.update_by_id(author.id, {"name": "B"})
+            assert (await FakeAuthorRepo.find_by_id(author.id)).name == "B jr."
+
+            await FakeAuthorRepo.upsert({"id": author.id, "name": "C"}, ["id"])
+            assert (await FakeAuthorRepo.find_by_id(author.id)).name == "C jr."
+
+        assert await FakeAuthorRepo.find_by_id(author.id) is not found
+
+    async def test_identity_map_keeps_pivot_rows_apart(self):
+        posts = await FakePostRepo.create_return_many([{"author_id": 1, "title": title} for title in "AB"])
+        tag = await FakeTagRepo.create_return({"title": "T"})
+        await FakePostToTagRepo.create_many([{"post_id": post.id, "tag_id": tag.id} for post in posts])
+        relation = FakePostRepo.belongs_to_many(
+            FakeTagRepo, "fake_posts_to_fake_tags", None, "id", "post_id", "id", "tag_id"
+        )
+
+        with IdentityMap.scope():
+            await relation.apply_many("tags", posts)
+
+        assert [[tag.title for tag in post.x_relations["tags"]] for post in posts] == [["T"], ["T"]]
+
+    async def test_unit_of_work(self):
+        authors = await FakeAuthorRepo.create_return_many([{"name": name} for name in "ABC"])
+
+        async with UnitOfWork() as unit_of_work:
+            loaded = await FakeAuthorRepo.get(FakeAuthorRepo.select_query().select("*").orderby("id"))
+            loaded[0].name = "Andy"
+            loaded[1].name = "Bob"
+            unit_of_work.delete(FakeAuthorRepo, loaded[2])
+            unit_of_work.add(FakeAuthorRepo, {"name": "D"})
+
+            assert (await FakeAuthorRepo.find_by_id(authors[0].id)).name == "A jr."
+
+        fresh = await FakeAuthorRepo.get(FakeAuthorRepo.select_query().select("*").orderby("id"))
+        assert [author.name for author in fresh] == ["Andy jr.", "Bob jr.", "D jr."]
+        assert UnitOfWork.dirty_columns(loaded[0]) == []
+
+    async def test_load(self, monkeypatch):
+        authors = await FakeAuthorRepo.create_return_many([{"name": name} for name in "AB"])
+        await FakeAuthorRepo.delete_model(authors[1])
+        batches = []
+        find_by_ids = FakeAuthorRepo.find_by_ids
+        monkeypatch.setattr(
+            FakeAuthorRepo, "find_by_ids",
+            lambda identifiers, *args: batches.append(identifiers) or find_by_ids(identifiers, *args),
+        )
+
+        first, second, missing, many = await asyncio.gather(
+            FakeAuthorRepo.load(authors[0].id),
+            FakeAuthorRepo.load(str(authors[1].id)),
+            FakeAuthorRepo.load(authors[1].id + 100),
+            FakeAuthorRepo.load_many([authors[1].id, authors[0].id, None], with_thrashed=True),
+        )
+
+        assert first.name == "A jr." and second is None and missing is None
+        assert [author and author.name for author in many] == [None, "A jr.", None]
+        assert len(batches) == 2
+
+        async def scoped():
+            with IdentityMap.scope():
+                loaded = await FakeAuthorRepo.load(authors[0].id)
+                return loaded is await FakeAuthorRepo.find_by_id(authors[0].id)
+
+        _, remembered = await asyncio.gather(FakeAuthorRepo.load(authors[0].id), scoped())
+        assert remembered is True and len(batches) == 4
+
+    async def test_entity_cache(self, monkeypatch):
+        monkeypatch.setattr(FakeAuthorRepo, "entity_cache_time_in_seconds", classmethod(lambda cls: 60))
+        await (await FakeAuthorRepo.cache()).flush()
+        author = await FakeAuthorRepo.create_return({"name": "A"})
+        await FakeAuthorRepo.find_by_id(author.id)
+
+        connection = await FakeAuthorRepo.connection()
+        await connection.execute(f"UPDATE fake_authors SET name = 'B' WHERE id = {author.id}")
+        assert (await FakeAuthorRepo.find_by_id(author.id)).name == "A jr."
+
+        async with connection.transaction():
+            await FakeAuthorRepo.update_by_id(author.id, {"name": "C"})
+            assert (await FakeAuthorRepo.find_by_ids([author.id]))[0].name == "C jr."
+
+        assert (await FakeAuthorRepo.find_by_id(author.id)).name == "C jr."
+
+        with pytest.raises(RuntimeError):
+            async with connection.transaction():
+                await FakeAuthorRepo.update_by_id(author.id, {"name": "E"})
+                assert (await FakeAuthorRepo.find_by_id(author.id)).name == "E jr."
+                raise RuntimeError()
+
+        assert (await FakeAuthorRepo.find_by_id(author.id)).name == "C jr."
+
+        await FakeAuthorRepo.update_where_in("name", ["C"], {"name": "D"})
+        assert (await FakeAuthorRepo.find_by_id(author.id)).name == "D jr."
+
+    async def test_layered_cache(self, monkeypatch):
+        monkeypatch.setattr(FakeAuthorRepo, "local_cache_size", classmethod(lambda cls: 10))
+        cache = await FakeAuthorRepo.cache()
+        other_worker = LayeredCache(LocalCache(), connection=cache._connection, prefix=cache._prefix)
+
+        await cache.set("key", {"a": 1}, 60)
+        await other_worker.get("key")
+        assert await cache.get("key") == {"a": 1}
+        assert "BACKBONE_ORM.CACHE.fake_authors.key" in other_worker.local
+
+        await cache.forget("key")
+        for _ in range(100):
+            if "BACKBONE_ORM.CACHE.fake_authors.key" not in other_worker.local:
+                break
+            await asyncio.sleep(0.01)
+
+        assert await other_worker.get("key") is None
+        assert cache.local.stats()["hits"] >= 1
+
+        await cache.set("key", {"a": 2}, 60)
+        stats = cache.local.stats()
+        assert "BACKBONE_ORM.CACHE.fake_authors.key" in cache.local
+        assert cache.local.stats() == stats
+
+        await cache.flush()
+        assert len(cache.local) == 0 and await cache.get("key") is None
+
+    async def test_relation_index(self):
+        index = RelationIndex([(1, "a"), ("1", "b"), ("x", "c"), (2, "d"), (1, "e")], lambda result: result[0])
+
+        assert [result[1] for result in index.get(1)] == ["a", "b", "e"]
+        assert [result[1] for result in index.get("1")] == ["a", "b", "e"]
+        assert [result[1] for result in index.get("x")] == ["c"]
+        assert index.get(3) == []
+
+    async def test_relation_tree(self):
+        tree = RelationTree.parse(["posts", "posts.author", "active_posts_relation", "posts.author.posts"])
+        assert list(tree.children) == ["posts", "active_posts"]
+        assert list(tree.children["posts"].children["author"].children) == ["posts"]
+
+        authors = await FakeAuthorRepo.create_return_many([{"name": name} for name in "AB"])
+        await FakePostRepo.create_many(
+            [{"author_id": authors[0].id, "title": "A", "is_active": 1}, {"author_id": authors[0].id, "title": "B", "is_active": 0}]
+        )
+
+        await FakeAuthorRepo.apply_relations(authors, ["posts", "posts.author", "active_posts"])
+
+        assert [len(author.posts) for author in authors] == [2, 0]
+        assert [post.title for post in authors[0].active_posts] == ["A"]
+        assert all(post.author.id == authors[0].id for post in authors[0].posts)
+
+    async def test_joined_relations(self):
+        authors = await FakeAuthorRepo.create_return_many([{"name": name} for name in "AB"])
+        await FakePostRepo.create_many(
+            [{"author_id": authors[0].id, "title": "A"}, {"author_id": authors[0].id + 100, "title": "B"}]
+        )
+
+        query = await FakePostRepo.joined_query(["author"])
+        posts = await FakePostRepo.get(query.orderby(FakePostRepo.field("id")))
+
+        assert [post.title for post in posts] == ["A", "B"]
+        assert posts[0].author.name == "A jr." and posts[1].author is None
+        assert "author" in posts[1].x_applied_relations
+        with pytest.raises(RelationNotJoinableException):
+            await FakeAuthorRepo.joined_query(["posts"])
+
+    async def test_limit_per_parent(self):
+        authors = await FakeAuthorRepo.create_return_many([{"name": name} for name in "AB"])
+        await FakePostRepo.create_many(
+            [{"author_id": author.id, "title": title} for author in authors for title in "XYZ"]
+        )
+
+        relation = FakeAuthorRepo.has_many(FakePostRepo, "author_id", "id").limit_per_parent(2, "title", True)
+        await relation.apply_many("posts", authors)
+
+        assert [[post.title for post in author.posts] for author in authors] == [["Z", "Y"], ["Z", "Y"]]
+
+    async def test_relation_aggregates(self):
+        authors = await FakeAuthorRepo.create_return_many([{"name": name} for name in "AB"])
+        await FakePostRepo.create_many(
+            [{"author_id": authors[0].id, "title": title, "is_active": 1} for title in "XY"]
+            + [{"author_id": authors[0].id, "title": "Z", "is_active": 0}]
+        )
+
+        await FakeAuthorRepo.apply_relation_counts(authors, ["posts", "active_posts"])
+        await FakeAuthorRepo.apply_relation_sums(authors, ["posts"], "is_active")
+        await FakeAuthorRepo.apply_relation_exists(authors, ["posts"])
+
+        assert [author.aggregate("posts_count") for author in authors] == [3, 0]
+        assert [author.aggregate("active_posts_count") for author in authors] == [2, 0]
+        assert [author.aggregate("posts_sum_is_active") for author in authors] == [2, 0]
+        assert [author.aggregate("posts_exists") for author in authors] == [True, False]
+        assert "posts" not in authors[0].x_applied_relations
+
+        ordered = FakeAuthorRepo.has_many(FakePostRepo, "author_id", "id").callback(
+            lambda query: query.orderby(Field("title")).limit(1)
+        )
+        assert await ordered.aggregate(authors) == [3, 0]
+
+    async def test_cache_codec(self, monkeypatch):
+        author = await FakeAuthorRepo.create_return({"name": "A"})
+        await FakeAuthorRepo.apply_relation(author, "posts")
+        codec = CacheCodec(compress_threshold=10)
+
+        payload = codec.serialize({"author": author, "items": [1, "a"]})
+        decoded = codec.deserialize(payload)
+
+        assert payload[1] == CacheCodec.COMPRESSED
+        assert decoded["items"] == [1, "a"]
+        assert decoded["author"].name == author.name and decoded["author"].posts == []
+
+        monkeypatch.setattr(CacheCodec, "columns", classmethod(lambda cls, model_class: (("id",), 0)))
+        assert codec.deserialize(payload) is None
+        assert codec.deserialize(b"\x80old pickle") is None
+
+    async def test_cache_flight(self):
+        await (await FakeAuthorRepo.cache()).flush()
+        author = await FakeAuthorRepo.create_return({"name": "A"})
+        await FakePostRepo.create_many([{"author_id": author.id, "title": "X"}])
+        fetches = []
+
+        def relation():
+            relation = FakeAuthorRepo.has_many(FakePostRepo, "author_id", "id", cache_time_in_seconds=60)
+            fetch = relation.fetch
+            relation.fetch = lambda identifiers: fetches.append(identifiers) or fetch(identifiers)
+            return relation
+
+        copies = [FakeAuthor(id=author.id, name=author.name, metadata=None) for _ in range(3)]
+        await asyncio.gather(*[relation().apply_many("posts", [copy]) for copy in copies])
+
+        assert len(fetches) == 1
+        assert [[post.title for post in copy.posts] for copy in copies] == [["X"]] * 3
+
+        flight = CacheFlight(FakeAuthorRepo.cache, ["early"], early_refresh_beta=1)
+        await (await FakeAuthorRepo.cache()).set(
+            "early", {CacheFlight.VALUE: 1, CacheFlight.EXPIRES_AT: 0, CacheFlight.DELTA: 1}
+        )
+        async with flight:
+            assert await flight.read() == [None]
+
+        cache = await FakeAuthorRepo.cache()
+        assert await cache.lock("lock", "a", 10) and not await cache.lock("lock", "b", 10)
+        assert not await cache.unlock("lock", "b") and await cache.unlock("lock", "a")
+        assert not await cache.locked("lock")
+
+    async def test_versioned_relation_cache(self, monkeypatch):
+        await (await FakeAuthorRepo.cache()).flush()
+        author = await FakeAuthorRepo.create_return({"name": "A"})
+        await FakePostRepo.create_many([{"author_id": author.id, "title": "X"}])
+
+        def relation():
+            return FakeAuthorRepo.has_many(FakePostRepo, "author_id", "id", cache_time_in_seconds=60).versioned("name")
+
+        await relation().apply_many("posts", [author])
+        await FakePostRepo.create_many([{"author_id": author.id, "title": "Y"}])
+        await relation().apply_many("posts", [author])
+        assert [post.title for post in author.posts] == ["X"]
+
+        await FakeAuthorRepo.update_by_id(author.id, {"name": "B"})
+        author = await FakeAuthorRepo.find_by_id(author.id)
+        await relation().apply_many("posts", [author])
+        assert relation().cache_key(author, "posts").endswith("::vB jr.")
+        assert sorted(post.title for post in author.posts) == ["X", "Y"]
+
+        # Writes within the same second still move the default updated_at version.
+        monkeypatch.setattr(FakeAuthorRepo, "updated_at_field", classmethod(lambda cls: "updated_at"))
+        updated_at = FakeAuthorRepo.update_attributes({})["updated_at"]
+        await asyncio.sleep(0.001)
+        assert FakeAuthorRepo.update_attributes({})["updated_at"] > updated_at
+
+    async def test_empty_relation_cache(self):
+        await (await FakeAuthorRepo.cache()).flush()
+        author = await FakeAuthorRepo.create_return({"name": "A"})
+        fetches = []
+
+        def relation():
+            relation = FakeAuthorRepo.has_many(FakePostRepo, "author_id", "id", cache_time_in_seconds=60).cache_empty(5)
+            fetch = relation.fetch
+            relation.fetch = lambda identifiers: fetches.append(identifiers) or fetch(identifiers)
+            return relation
+
+        await relation().apply_many("posts", [author])
+        await relation().apply_many("posts", [author])
+
+        assert len(fetches) == 1
+        assert author.posts == []
+        assert await (await FakeAuthorRepo.cache()).get(relation().cache_key(author, "posts")) == relation().EMPTY
+
+    async def test_trusted_hydration(self, monkeypatch):
+        author = await FakeAuthorRepo.create_return({"name": "A", "metadata": {"a": 1}})
+        await FakePostRepo.create_many([{"author_id": author.id, "title": "X"}])
+        monkeypatch.setattr(FakeAuthorRepo, "trusted_hydration", classmethod(lambda cls: True))
+        monkeypatch.setattr(FakePostRepo, "trusted_hydration", classmethod(lambda cls: True))
+
+        trusted = await FakeAuthorRepo.find_by_id(author.id)
+        posts = await FakePostRepo.all()
+
+        assert trusted == author
+        assert trusted.metadata == {"a": 1}
+        assert [post.author_id for post in posts] == [author.id]
+
+        post = Hydrator.of(FakePost).hydrate({"id": 1, "title": "X", "author_id": "2", "is_active": 1})
+        assert post.author_id == 2
+        with pytest.raises(ValueError):
+            Hydrator.of(FakePost).hydrate({"id": 1, "title": "X", "author_id": "a", "is_active": 1})
+
+        assert Hydrator.trusted_types(Optional[int]) == Hydrator.trusted_types(int | None) == (int, type(None))
+
+        class StrictPost(FakePost):
+            model_config = {**FakePost.model_config, "strict": True}
+
+        with pytest.raises(ValueError):
+            Hydrator.of(StrictPost).hydrate({"id": 1, "title": "X", "author_id": "2", "is_active": 1})
+
+    async def test_concurrent_relations_on_pool(self, monkeypatch):
+        author = await FakeAuthorRepo.create_return({"name": "A"})
+        await FakePostRepo.create_many([{"author_id": author.id, "title": "X"}])
+
+        server = postgres.get_driver(DriverEnum.TEST).server()
+        pool = PostgresManager(
+            default=DriverEnum.POOL,
+            config=ConnectionConfig(
+                host="127.0.0.1", port=server.settings["port"], user="postgres", db="test",
+                pool_min_size=1, pool_max_size=3,
+            ),
+        )
+        connection = await pool.acquire(None, "request")
+        for repo in [FakeAuthorRepo, FakePostRepo]:
+            monkeypatch.setattr(repo, "connection", classmethod(lambda cls: asyncio.sleep(0, connection)))
+            monkeypatch.setattr(repo, "relation_concurrency", classmethod(lambda cls: 4))
+
+        try:
+            # Nested levels reuse their parent's sibling, so two branches never need more than three connections.
+            author = await FakeAuthorRepo.find_by_id(
+                author.id, relations=["posts.author", "posts.writer", "active_posts.author", "active_posts.writer"]
+            )
+        finally:
+            await pool.release(None, "request")
+            await (await pool.get_driver(DriverEnum.POOL).pool()).close()
+
+        assert [post.author.name for post in author.posts] == ["A jr."]
+        assert [post.writer.name for post in author.active_posts] == ["A jr."]
+
+    async def test_upsert_many(self):
+        author = await FakeAuthorRepo.create_return({"name": "A"})
+
+        authors = await FakeAuthorRepo.upsert_return_many(
+            [{"id": author.id, "name": "B"}, {"id": author.id + 1, "name": "C"}],
+            conflict_columns=["id"],
+        )
+        await FakeAuthorRepo.upsert({"id": author.id, "name": "D"}, ["id"], update_columns=[])
+
+        assert [author.name for author in authors] == ["B jr.", "C jr."]
+        assert (await FakeAuthorRepo.find_by_id(author.id)).name == "B jr."
+        assert len(await FakeAuthorRepo.all()) == 2
+
+    async def test_update_many(self):
+        authors = await FakeAuthorRepo.create_return_many(
+            [{"name": "A", "metadata": None}, {"name": "B", "metadata": {"a": 1}}, {"name": "C", "metadata": None}]
+        )
+        authors[0].name = "Andy"
+        authors[1].metadata = {"b": 2}
+        authors[2].name = "Cindy"
+
+        await FakeAuthorRepo.update_many(authors, ["name", "metadata"])
+        await FakeAuthorRepo.update_many([{"id": authors[0].id, "metadata": {"c": 3}}])
+        fresh = await FakeAuthorRepo.get(FakeAuthorRepo.select_query().select("*").orderby("id"))
+
+        assert [author.name for author in fresh] == ["Andy jr.", "B jr.", "Cindy jr."]
+        assert [author.metadata for author in fresh] == [{"c": 3}, {"b": 2}, None]
+        assert authors[2].x_original["name"] == "Cindy"
+
+        fresh[1].name = "Bob"
+        await FakeAuthorRepo.update_many(fresh)
+        assert (await FakeAuthorRepo.find_by_id(authors[1].id)).name == "Bob jr."
+        assert (await FakeAuthorRepo.find_by_id(authors[0].id)).metadata == {"c": 3}
+        # Two rows and one row setting name share one statement.
+        assert ("public", "fake_authors", "update_many", ("name",)) in FakeAuthorRepo.compiled_queries()
+
     async def test_delete_by_id(self):
         authors = await FakeAuthorRepo.create_return_many(
             [